@@ -0,0 +1,54 @@
+import argparse
+import json
+import sys
+
+from mcts.bench.benchmarks import default_cases, run_benchmarks, find_regressions
+from mcts.bench.scenarios import scenarios
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m mcts.bench", description="Throughput benchmarks of the MCTS core")
+    parser.add_argument("--simulations", type=int, default=1000, help="simulations per benchmark case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3, help="the fastest of this many repeats is reported")
+    parser.add_argument("--cases", nargs="*", help="only run the cases with these names")
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--baseline", help="json results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="fail when a throughput drops by more than this fraction of the baseline")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(scenarios),
+                        help="run these scenarios comparing variants of the search instead of the benchmark cases")
+    args = parser.parse_args()
+
+    if args.scenarios:
+        for name in args.scenarios:
+            print(f"--- {name} ---")
+            scenarios[name]()
+        return 0
+
+    cases = default_cases()
+    if args.cases:
+        cases = [case for case in cases if case.name in args.cases]
+
+    results = run_benchmarks(cases, simulations=args.simulations, seed=args.seed, repeats=args.repeats)
+    print(f"peak rss: {results['peak_rss_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, results, threshold=args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if len(regressions) != 0:
+            return 1
+        print(f"no throughput regressions over {args.threshold:.0%} against {args.baseline}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import random
+import resource
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Tuple
+
+from mcts.mcts_core.game_simulator import perform_simulation, create_root_node
+from mcts.mcts_core.mc_default_policy import RandomDefaultPolicy
+from mcts.mcts_core.mc_profiling import SimulationProfile
+from mcts.mcts_core.mc_tree import TreeNode
+from mcts.mcts_core.mc_tree_funcs import rollout, tree_memory_stats
+from mcts.mcts_core.mc_tree_policy import UctTreePolicy
+from mcts.mcts_core.state_manager import StateManager
+from mcts.test_games.ledge_bitboard_state_manager import BitboardLedgeStateManager
+from mcts.test_games.ledge_boards import ledge_boards
+from mcts.test_games.ledge_state_manager import LedgeStateManager, LedgeGameConfig
+from mcts.test_games.nim_state_manager import NimStateManager
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    name: str
+    state_manager: StateManager
+    use_compact_tree: bool = False
+
+
+@dataclass
+class BenchmarkResult:
+    case: str
+    simulations: int
+    simulations_per_second: float
+    nodes_per_second: float
+    rollouts_per_second: float
+    bytes_per_node: float  # of the tree grown by the simulations, game states excluded
+    phase_seconds: Dict[str, float]  # time spent in each phase of perform_simulation
+
+
+def default_cases() -> List[BenchmarkCase]:
+    ledge_cases = [
+        BenchmarkCase(f"ledge_{name}", LedgeStateManager(LedgeGameConfig(initial_board=board)))
+        for name, board in ledge_boards.items()
+    ]
+    ledge_cases.append(BenchmarkCase(
+        "ledge_bitboard_large", BitboardLedgeStateManager(LedgeGameConfig(initial_board=ledge_boards['large']))
+    ))
+    ledge_cases.append(BenchmarkCase(
+        "ledge_compact_large", LedgeStateManager(LedgeGameConfig(initial_board=ledge_boards['large'])),
+        use_compact_tree=True
+    ))
+    nim_cases = [
+        BenchmarkCase(f"nim_{num_pieces}_{max_remove}", NimStateManager(num_pieces, max_remove, 0))
+        for num_pieces, max_remove in [(10, 3), (50, 5), (200, 10)]
+    ]
+    return ledge_cases + nim_cases
+
+
+def _simulation_throughput(state_manager: StateManager, simulations: int, use_compact_tree: bool = False) \
+        -> Tuple[float, float, TreeNode]:
+    """Returns: simulations and nodes added per second, growing one tree from the initial state, and that tree"""
+    tree_policy = UctTreePolicy(uct_c=1)
+    default_policy = RandomDefaultPolicy(state_manager=state_manager)
+    root_node = create_root_node(state_manager.get_initial_state(), 0, use_compact_tree=use_compact_tree)
+
+    nodes = 0
+    start = time.perf_counter()
+    for i in range(simulations):
+        nodes += perform_simulation(state_manager, root_node, tree_policy, default_policy)
+    elapsed = time.perf_counter() - start
+    return simulations / elapsed, nodes / elapsed, root_node
+
+
+def _phase_times(state_manager: StateManager, simulations: int, use_compact_tree: bool = False) -> Dict[str, float]:
+    """Times the phases of perform_simulation with a simulation profile, on the same tree backend as the throughput"""
+    tree_policy = UctTreePolicy(uct_c=1)
+    default_policy = RandomDefaultPolicy(state_manager=state_manager)
+    root_node = create_root_node(state_manager.get_initial_state(), 0, use_compact_tree=use_compact_tree)
+
+    profile = SimulationProfile()
+    for i in range(simulations):
+        perform_simulation(state_manager, root_node, tree_policy, default_policy, profile=profile)
+    return dict(profile.phase_seconds)
+
+
+def _rollout_throughput(state_manager: StateManager, rollouts: int) -> float:
+    default_policy = RandomDefaultPolicy(state_manager=state_manager)
+    initial_state = state_manager.get_initial_state()
+    start = time.perf_counter()
+    for i in range(rollouts):
+        rollout(state_manager, initial_state, default_policy=default_policy)
+    return rollouts / (time.perf_counter() - start)
+
+
+def run_case(case: BenchmarkCase, simulations: int, seed: int, repeats: int = 3) -> BenchmarkResult:
+    """Every measurement is repeated with the same seed, the fastest repeat is kept to reduce noise"""
+    simulation_throughputs = []
+    rollout_throughputs = []
+    phase_times = []
+    for i in range(repeats):
+        random.seed(seed)
+        simulation_throughputs.append(_simulation_throughput(case.state_manager, simulations, case.use_compact_tree))
+        random.seed(seed)
+        rollout_throughputs.append(_rollout_throughput(case.state_manager, simulations))
+        random.seed(seed)
+        phase_times.append(_phase_times(case.state_manager, simulations, case.use_compact_tree))
+
+    simulations_per_second, nodes_per_second, root_node = max(simulation_throughputs, key=lambda result: result[0])
+    rollouts_per_second = max(rollout_throughputs)
+    phase_seconds = min(phase_times, key=lambda times: sum(times.values()))
+    return BenchmarkResult(
+        case=case.name,
+        simulations=simulations,
+        simulations_per_second=simulations_per_second,
+        nodes_per_second=nodes_per_second,
+        rollouts_per_second=rollouts_per_second,
+        bytes_per_node=tree_memory_stats(root_node).bytes_per_node,
+        phase_seconds=phase_seconds
+    )
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmarks(cases: List[BenchmarkCase], simulations: int, seed: int, repeats: int = 3) -> Dict[str, Any]:
+    results = []
+    for case in cases:
+        result = run_case(case, simulations, seed, repeats=repeats)
+        print(f"{result.case:>20}: {result.simulations_per_second:>9.0f} sims/s {result.nodes_per_second:>10.0f} nodes/s "
+              f"{result.rollouts_per_second:>9.0f} rollouts/s {result.bytes_per_node:>6.0f} bytes/node")
+        results.append(result)
+
+    return {
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'seed': seed,
+        'simulations': simulations,
+        'repeats': repeats,
+        'peak_rss_mb': peak_rss_mb(),
+        'cases': [asdict(result) for result in results]
+    }
+
+
+def find_regressions(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compares every throughput metric of the cases present in both runs
+    Returns: a description of every metric that dropped by more than the threshold fraction
+    """
+    baseline_cases = {case['case']: case for case in baseline['cases']}
+    regressions = []
+    for case in current['cases']:
+        baseline_case = baseline_cases.get(case['case'])
+        if baseline_case is None:
+            continue
+        for metric, value in case.items():
+            if not metric.endswith('_per_second') or metric not in baseline_case:
+                continue
+            baseline_value = baseline_case[metric]
+            if value < baseline_value * (1 - threshold):
+                regressions.append(
+                    f"{case['case']} {metric}: {value:.0f} < {baseline_value:.0f} ({value / baseline_value - 1:+.1%})"
+                )
+    return regressions
@@ -0,0 +1,264 @@
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+from typing import List, Tuple, Callable, Dict, Optional
+
+import numpy as np
+
+from mcts.bench.benchmarks import _rollout_throughput
+from mcts.mcts_core.action_state_manager import ActionBackedStateManager
+from mcts.mcts_core.game_simulator import GameSimulatorConfig, SearchStats, create_search_root_node, \
+    create_tree_policy, perform_search, perform_threaded_search
+from mcts.mcts_core.mc_array_tree import ArrayTree
+from mcts.mcts_core.mc_default_policy import RandomDefaultPolicy
+from mcts.mcts_core.mc_leaf_evaluator import RolloutLeafEvaluator, ModelLeafEvaluator, LinearValueModel
+from mcts.mcts_core.mc_tree import TreeNode, CompactTreeNode
+from mcts.mcts_core.mc_tree_funcs import EdgePath, backprop_node_value, backprop_edge_path, count_tree_nodes, \
+    follow_most_traversed_child_edge
+from mcts.mcts_core.mc_tree_policy import UctTreePolicy
+from mcts.mcts_core.state_manager import StateManager, GameState
+from mcts.mcts_core.tabulated_state_manager import TabulatedStateManager
+from mcts.test_games.ledge_action_state_manager import LedgeActionStateManager
+from mcts.test_games.ledge_boards import ledge_board_large, ledge_board_small, ledge_board_from_notes
+from mcts.test_games.ledge_state_manager import LedgeStateManager, LedgeGameConfig
+from mcts.test_games.nim_state_manager import NimStateManager
+
+
+def _search(config: GameSimulatorConfig, state: Optional[GameState] = None, next_player: Optional[int] = None,
+            threaded: bool = False) -> Tuple[TreeNode, SearchStats]:
+    """
+    Grows the search tree of one move as an episode would, from the initial state of the game if no state is given,
+    with the tree parallel search if threaded is set
+    Returns: the root node and the stats of the search
+    """
+    state_manager = config.game_state_manager
+    state = state if state is not None else state_manager.get_initial_state()
+    next_player = next_player if next_player is not None else config.starting_player
+    root_node = create_search_root_node(config, state, next_player)
+    tree_policy = create_tree_policy(config)
+    if threaded:
+        stats = perform_threaded_search(config, state_manager, root_node, tree_policy)
+    else:
+        stats = perform_search(config, state_manager, root_node, tree_policy,
+                               RandomDefaultPolicy(state_manager=state_manager))
+    return root_node, stats
+
+
+def _deepest_paths(root_node: TreeNode, num_paths: int) -> List[Tuple[EdgePath, TreeNode]]:
+    """The edge paths of the num_paths deepest leaves"""
+    paths = []
+    stack = [([], root_node)]
+    while len(stack) > 0:
+        edges, node = stack.pop()
+        if node.num_children() == 0:
+            paths.append((edges, node))
+        for index, child in enumerate(node.iter_children()):
+            stack.append((edges + [(node, index)], child))
+    paths.sort(key=lambda path: len(path[0]), reverse=True)
+    return paths[:num_paths]
+
+
+def backprop(simulations: int = 20000, num_paths: int = 200, batch_size: int = 32):
+    """Backprop through parent pointers against backprop along recorded edge paths, of one value and of a batch"""
+    # progressive widening grows deep and narrow trees
+    state_manager = LedgeStateManager(LedgeGameConfig(initial_board=ledge_board_large))
+    print(f"{'tree':>8} {'depth':>6} {'parent (us)':>12} {'edges (us)':>11} "
+          f"{batch_size} values: {'loop (us)':>10} {'batch (us)':>11}")
+    for use_compact_tree in [False, True]:
+        random.seed(0)
+        root_node, _ = _search(GameSimulatorConfig(state_manager, verbose=False, simulations_per_move=simulations,
+                                                   lazy_expansion=True, widening_constant=1, widening_exponent=0.25,
+                                                   use_compact_tree=use_compact_tree))
+        paths = _deepest_paths(root_node, num_paths)
+        depth = sum(len(edges) for edges, _ in paths) / len(paths)
+        values = [random.choice([-1, 1]) for i in range(batch_size)]
+
+        def per_path_us(backprop_path) -> float:
+            number = 20
+            return timeit.timeit(lambda: [backprop_path(edges, leaf) for edges, leaf in paths], number=number) \
+                / (number * len(paths)) * 1e6
+
+        parent_us = per_path_us(lambda edges, leaf: backprop_node_value(leaf, 1, root_node=root_node))
+        edges_us = per_path_us(lambda edges, leaf: backprop_edge_path(edges, leaf, 1))
+        values_loop_us = per_path_us(lambda edges, leaf: [backprop_node_value(leaf, value, root_node=root_node)
+                                                          for value in values])
+        values_batch_us = per_path_us(lambda edges, leaf: backprop_edge_path(edges, leaf, values))
+
+        name = "compact" if use_compact_tree else "object"
+        print(f"{name:>8} {depth:>6.1f} {parent_us:>12.2f} {edges_us:>11.2f} "
+              f"{'':>{len(str(batch_size)) + 8}}{values_loop_us:>10.2f} {values_batch_us:>11.2f}")
+
+
+def _wide_node(branching_factor: int, backend: str) -> TreeNode:
+    if backend == "array":
+        root = ArrayTree().create_root(None, next_player=0)
+    else:
+        root = CompactTreeNode(None, next_player=0) if backend == "compact" else TreeNode(None, next_player=0)
+    root.add_children_from_states([None] * branching_factor)
+    root.visits = 10 * branching_factor
+    for edge in root.get_children_edges():
+        edge.traversals = random.randint(0, 20)
+        edge.eval = random.uniform(-edge.traversals, edge.traversals)
+        edge.q_value = edge.eval / edge.traversals if edge.traversals != 0 else 0
+    return root
+
+
+def tree_policy():
+    """The list based uct policy against the vectorized one, on single nodes of every tree backend"""
+    random.seed(0)
+    policies = [
+        ("list", UctTreePolicy(uct_c=1)),
+        ("vectorized", UctTreePolicy(uct_c=1, vectorized=True))
+    ]
+    print(f"{'branching':>10} {'backend':>8} " + " ".join(f"{name + ' (us)':>16}" for name, _ in policies))
+    for branching_factor in [2, 5, 10, 20, 50, 100, 200]:
+        for backend in ["object", "compact", "array"]:
+            node = _wide_node(branching_factor, backend)
+            picked = {policy.follow_policy(node) for _, policy in policies}
+            if len(picked) != 1:
+                raise AssertionError("vectorized uct picked a different child")
+
+            number = 2000
+            times_us = [
+                timeit.timeit(lambda: policy.follow_policy(node), number=number) / number * 1e6
+                for _, policy in policies
+            ]
+            print(f"{branching_factor:>10} {backend:>8} " + " ".join(f"{t:>16.2f}" for t in times_us))
+
+
+def _batch_rollout_throughput(state_manager: StateManager, batch_size: int, num_batches: int) -> float:
+    initial_state = state_manager.get_initial_state()
+    start = time.perf_counter()
+    for i in range(num_batches):
+        state_manager.batch_rollout(initial_state, batch_size)
+    return batch_size * num_batches / (time.perf_counter() - start)
+
+
+def rollouts():
+    """Rollouts of the default policy one at a time against batch_rollout with growing batches"""
+    random.seed(0)
+    state_managers = [
+        ("ledge small", LedgeStateManager(LedgeGameConfig(initial_board=ledge_board_small))),
+        ("ledge large", LedgeStateManager(LedgeGameConfig(initial_board=ledge_board_large))),
+        ("nim 10/3", NimStateManager(10, 3, 0)),
+        ("nim 100/10", NimStateManager(100, 10, 0))
+    ]
+    batch_sizes = [1, 8, 64, 512]
+
+    print(f"{'game':>12} {'scalar':>10} " + " ".join(f"{'batch ' + str(k):>10}" for k in batch_sizes) + "   (rollouts/s)")
+    for name, state_manager in state_managers:
+        scalar = _rollout_throughput(state_manager, 2000)
+        batched = [
+            _batch_rollout_throughput(state_manager, batch_size=k, num_batches=max(1, 2000 // k))
+            for k in batch_sizes
+        ]
+        print(f"{name:>12} {scalar:>10.0f} " + " ".join(f"{r:>10.0f}" for r in batched))
+
+
+def leaf_batch_size(simulations: int = 2000):
+    """Simulations per second of leaf evaluators by the number of leaves evaluated at once"""
+    state_manager = LedgeStateManager(LedgeGameConfig(initial_board=ledge_board_large))
+    features = len(state_manager.encode_state(state_manager.get_initial_state()))
+    evaluators = [
+        ("rollout", RolloutLeafEvaluator(state_manager)),
+        ("linear model", ModelLeafEvaluator(state_manager, LinearValueModel(np.random.default_rng(0).normal(size=features))))
+    ]
+    print(f"{'evaluator':>14} {'batch size':>10} {'sims/s':>10}")
+    for name, evaluator in evaluators:
+        for batch_size in [1, 8, 32, 128]:
+            random.seed(0)
+            _, stats = _search(GameSimulatorConfig(state_manager, verbose=False, simulations_per_move=simulations,
+                                                   leaf_evaluator=evaluator, leaf_batch_size=batch_size))
+            print(f"{name:>14} {batch_size:>10} {stats.simulations / stats.elapsed:>10.0f}")
+
+
+def tree_parallel_workers(simulations: int = 2000):
+    """Simulations per second of the tree parallel search by the number of threads, cheap and costly leaves"""
+    gil_enabled = sys._is_gil_enabled() if hasattr(sys, '_is_gil_enabled') else True
+    print(f"python {sys.version.split()[0]}, gil {'enabled' if gil_enabled else 'disabled'}")
+
+    state_manager = LedgeStateManager(LedgeGameConfig(initial_board=ledge_board_large))
+    print(f"{'rollouts':>8} {'workers':>8} {'sims/s':>10} {'speedup':>8}")
+    for num_rollouts in [1, 64]:
+        baseline = None
+        for workers in [1, 2, 4, 8, 16]:
+            random.seed(0)
+            root_node, stats = _search(GameSimulatorConfig(state_manager, verbose=False, simulations_per_move=simulations,
+                                                           leaf_evaluator=RolloutLeafEvaluator(state_manager, num_rollouts),
+                                                           tree_parallel_workers=workers), threaded=True)
+            if root_node.visits != simulations or sum(edge.traversals for edge in root_node.get_children_edges()) != simulations:
+                raise AssertionError("lost updates in the root statistics")
+            simulations_per_second = simulations / stats.elapsed
+            baseline = simulations_per_second if baseline is None else baseline
+            print(f"{num_rollouts:>8} {workers:>8} {simulations_per_second:>10.0f} {simulations_per_second / baseline:>8.2f}")
+
+
+def action_tree(simulations: int = 5000):
+    """Trees of states against trees of actions applied in place, by memory and speed"""
+    ledge_config = LedgeGameConfig(initial_board=ledge_board_large)
+    configs = [
+        ("states", GameSimulatorConfig(LedgeStateManager(ledge_config), verbose=False,
+                                       simulations_per_move=simulations, lazy_expansion=True)),
+        ("actions", GameSimulatorConfig(ActionBackedStateManager(LedgeActionStateManager(ledge_config)), verbose=False,
+                                        simulations_per_move=simulations, lazy_expansion=True, action_tree=True))
+    ]
+    print(f"{'tree':>8} {'nodes':>8} {'bytes/node':>10} {'sims/s':>8}")
+    for name, config in configs:
+        random.seed(0)
+        _, stats = _search(config)
+        # measured separately, tracing slows the search down
+        random.seed(0)
+        tracemalloc.start()
+        root_node, _ = _search(config)
+        tree_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        nodes = count_tree_nodes(root_node)
+        print(f"{name:>8} {nodes:>8} {tree_bytes / nodes:>10.0f} {stats.simulations / stats.elapsed:>8.0f}")
+
+
+def _optimal_move_rate(tabulated: TabulatedStateManager, simulations: int, positions: List[int]) -> float:
+    """The fraction of the positions where the move chosen by a search of the given size is optimal"""
+    optimal = 0
+    config = GameSimulatorConfig(tabulated, verbose=False, simulations_per_move=simulations)
+    for position in positions:
+        root_node, _ = _search(config, position, int(tabulated.player_to_move[position]))
+        chosen = root_node.get_children().index(follow_most_traversed_child_edge(root_node))
+        optimal += chosen in tabulated.optimal_actions(position)
+    return optimal / len(positions)
+
+
+def tabulated_convergence(num_positions: int = 100):
+    """How often searches of growing size find an optimal move, checked against the values of the tabulated games"""
+    games = [
+        ("nim 50/5", NimStateManager(50, 5, 0)),
+        ("ledge from notes", LedgeStateManager(LedgeGameConfig(initial_board=ledge_board_from_notes)))
+    ]
+    for name, state_manager in games:
+        start = time.perf_counter()
+        tabulated = TabulatedStateManager(state_manager)
+        print(f"{name}: {len(tabulated)} states tabulated in {time.perf_counter() - start:.2f}s, "
+              f"initial state won by player {tabulated.game_value(0) + 1}")
+
+        # positions where the player to move can win, but not with every move
+        random.seed(0)
+        positions = [
+            index for index in range(len(tabulated))
+            if not tabulated.is_terminal[index]
+            and 0 < len(tabulated.optimal_actions(index)) < tabulated.get_legal_action_count(index)
+        ]
+        positions = random.sample(positions, min(num_positions, len(positions)))
+        for simulations in [10, 30, 100, 300, 1000]:
+            print(f"{simulations:>6} simulations: optimal move in {_optimal_move_rate(tabulated, simulations, positions):.0%}")
+
+
+scenarios: Dict[str, Callable[[], None]] = {
+    'backprop': backprop,
+    'tree_policy': tree_policy,
+    'rollouts': rollouts,
+    'leaf_batch_size': leaf_batch_size,
+    'tree_parallel_workers': tree_parallel_workers,
+    'action_tree': action_tree,
+    'tabulated_convergence': tabulated_convergence,
+}
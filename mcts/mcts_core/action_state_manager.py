@@ -0,0 +1,153 @@
+import random
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+
+from mcts.mcts_core.state_manager import StateManager, GameState
+
+Action = Any
+
+
+class ActionStateManager(ABC):
+    """
+    The rules of a game in terms of actions, as an alternative to the successor states of StateManager.
+    Trees can then store actions and create states only when they are needed
+    """
+
+    @abstractmethod
+    def get_initial_state(self) -> GameState:
+        pass
+
+    @abstractmethod
+    def legal_actions(self, state: GameState) -> List[Action]:
+        """The actions of the player to move, always in the same order for the same state"""
+        pass
+
+    @abstractmethod
+    def apply(self, state: GameState, action: Action) -> GameState:
+        """The state after the action, the given state is left unchanged"""
+        pass
+
+    @abstractmethod
+    def is_terminal_state(self, state: GameState) -> bool:
+        pass
+
+    @abstractmethod
+    def player_won(self, state: GameState) -> int:
+        pass
+
+    @abstractmethod
+    def action_str(self, state: GameState, action: Action) -> str:
+        """Describes the action made from the given state"""
+        pass
+
+    def state_str(self, state: GameState) -> str:
+        """Describes a state reached without an action, like the initial state"""
+        return f"State: {state}"
+
+    def rollout(self, state: GameState) -> int:
+        """
+        Plays uniformly random actions from the state until the game ends
+        Returns: the winning player
+        """
+        while not self.is_terminal_state(state):
+            state = self.apply(state, random.choice(self.legal_actions(state)))
+        return self.player_won(state)
+
+
+class InPlaceActionStateManager(ActionStateManager):
+    """
+    An ActionStateManager for games with mutable states, whose actions can be applied to a state itself and undone.
+    Descents and rollouts then change one state instead of creating a state per action
+    """
+
+    @abstractmethod
+    def apply_in_place(self, state: GameState, action: Action) -> Any:
+        """
+        Applies the action to the state itself
+        Returns: what undo needs to restore the state
+        """
+        pass
+
+    @abstractmethod
+    def undo(self, state: GameState, action: Action, undo_info: Any):
+        pass
+
+    def rollout(self, state: GameState) -> int:
+        """
+        Plays uniformly random actions from the state until the game ends, in place, undoing every action afterwards,
+        so no state is allocated and the state is unchanged
+        Returns: the winning player
+        """
+        undo_stack = []
+        try:
+            while not self.is_terminal_state(state):
+                action = random.choice(self.legal_actions(state))
+                undo_stack.append((action, self.apply_in_place(state, action)))
+            return self.player_won(state)
+        finally:
+            for action, undo_info in reversed(undo_stack):
+                self.undo(state, action, undo_info)
+
+
+class SuccessorActionStateManager(ActionStateManager):
+    """Presents a StateManager as an ActionStateManager, the actions are indices into the successor states"""
+
+    def __init__(self, state_manager: StateManager):
+        self.state_manager = state_manager
+
+    def get_initial_state(self) -> GameState:
+        return self.state_manager.get_initial_state()
+
+    def legal_actions(self, state: GameState) -> List[int]:
+        return list(range(self.state_manager.get_legal_action_count(state)))
+
+    def apply(self, state: GameState, action: int) -> GameState:
+        return self.state_manager.apply_action(state, action)
+
+    def is_terminal_state(self, state: GameState) -> bool:
+        return self.state_manager.is_terminal_state(state)
+
+    def player_won(self, state: GameState) -> int:
+        return self.state_manager.player_won(state)
+
+    def action_str(self, state: GameState, action: int) -> str:
+        return self.state_manager.action_str(self.apply(state, action), state)
+
+
+class ActionBackedStateManager(StateManager):
+    """Presents an ActionStateManager as a StateManager, so it can be used everywhere a StateManager is expected"""
+
+    def __init__(self, action_state_manager: ActionStateManager):
+        self.action_state_manager = action_state_manager
+
+    def get_initial_state(self) -> GameState:
+        return self.action_state_manager.get_initial_state()
+
+    def get_successor_states(self, state: GameState) -> List[GameState]:
+        return [
+            self.action_state_manager.apply(state, action)
+            for action in self.action_state_manager.legal_actions(state)
+        ]
+
+    def get_legal_action_count(self, state: GameState) -> int:
+        return len(self.action_state_manager.legal_actions(state))
+
+    def apply_action(self, state: GameState, action_index: int) -> GameState:
+        return self.action_state_manager.apply(state, self.action_state_manager.legal_actions(state)[action_index])
+
+    def sample_successor_state(self, state: GameState) -> GameState:
+        return self.action_state_manager.apply(state, random.choice(self.action_state_manager.legal_actions(state)))
+
+    def is_terminal_state(self, state: GameState) -> bool:
+        return self.action_state_manager.is_terminal_state(state)
+
+    def player_won(self, state: GameState) -> int:
+        return self.action_state_manager.player_won(state)
+
+    def action_str(self, state: GameState, previous_state: Optional[GameState]) -> str:
+        # the action is found among those of the previous state, as states do not record how they were reached
+        if previous_state is not None:
+            for action in self.action_state_manager.legal_actions(previous_state):
+                if self.action_state_manager.apply(previous_state, action) == state:
+                    return self.action_state_manager.action_str(previous_state, action)
+        return self.action_state_manager.state_str(state)
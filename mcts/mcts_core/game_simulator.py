@@ -1,12 +1,31 @@
+import math
+import os
 import random
-from dataclasses import dataclass
-from typing import Tuple, List
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Tuple, List, Optional, Iterator, Union, Callable
 
+import numpy as np
+
+from mcts.mcts_core.mc_array_tree import ArrayTree
 from mcts.mcts_core.mc_default_policy import RandomDefaultPolicy
-from mcts.mcts_core.mc_tree import TreeNode
-from mcts.mcts_core.mc_tree_funcs import backprop_node_value, tree_search, print_tree, expand_node, \
-    TreePolicy, DefaultPolicy, rollout, follow_most_traversed_child_edge
+from mcts.mcts_core.mc_profiling import SimulationProfile
+from mcts.mcts_core.mc_search_budget import SearchBudget, SimulationBudget
+from mcts.mcts_core.mc_transposition import TranspositionTable
+from mcts.mcts_core.mc_tree import TreeNode, CompactTreeNode
+from mcts.mcts_core.mc_tree_funcs import print_tree, expand_node, TreePolicy, DefaultPolicy, rollout, \
+    follow_most_traversed_child_edge, count_tree_nodes, LeafEvaluator, apply_virtual_loss, \
+    revert_virtual_loss, prove_terminal_children, propagate_proven_winners, tree_search_edges, \
+    lazy_tree_search_edges, backprop_edge_path, update_proven_winner
+from mcts.mcts_core.mc_leaf_evaluator import RolloutLeafEvaluator
+from mcts.mcts_core.mc_tree_parallel import perform_tree_parallel_search
 from mcts.mcts_core.mc_tree_policy import UctTreePolicy
+from mcts.mcts_core.mc_tree_snapshot import save_tree_snapshot, TreeSnapshotHandle
+from mcts.mcts_core.action_state_manager import ActionStateManager, ActionBackedStateManager, SuccessorActionStateManager
+from mcts.mcts_core.mc_action_tree import ActionTreeNode, expand_action_node, perform_action_simulation
 from mcts.mcts_core.state_manager import StateManager, GameState
 
 
@@ -17,6 +36,25 @@ class GameSimulatorConfig:
     print_tree_every_move: bool = False
     simulations_per_move: int = 100
     starting_player: int = 0
+    use_array_tree: bool = False  # store the search tree in flat numpy arrays instead of TreeNode objects
+    use_compact_tree: bool = False  # store the search tree in CompactTreeNode objects, with less memory per node
+    action_tree: bool = False  # tree nodes store actions instead of states, states are created during the descent
+    vectorized_tree_policy: bool = False  # score all child edges in one numpy operation, pays off for wide nodes
+    root_parallel_workers: int = 1  # > 1 searches independent trees in that many processes and merges their root edges
+    reuse_tree: bool = False  # keep the subtree of the chosen move as the next search tree instead of starting over
+    transposition_table_size: int = 0  # > 0 shares nodes of identical positions, bounded to that many entries
+    rollouts_per_leaf: int = 1  # > 1 evaluates leaves with the mean of that many batched rollouts
+    search_budget: Optional[SearchBudget] = None  # when the search of a move stops, simulations_per_move if None
+    profile_simulations: bool = False  # record phase timings and search shape counters for every move
+    leaf_evaluator: Optional[LeafEvaluator] = None  # evaluates leaves instead of the random rollouts of the default policy
+    leaf_batch_size: int = 1  # > 1 evaluates that many leaves at once, descending with virtual loss
+    virtual_loss: int = 1  # lost traversals added along a path until its leaf is evaluated
+    tree_parallel_workers: int = 1  # > 1 searches the same tree with that many threads, TreeNode trees only
+    lazy_expansion: bool = False  # create children one at a time when selection reaches them, TreeNode trees only
+    widening_constant: float = 0  # > 0 limits lazily expanded nodes to widening_constant * visits ** widening_exponent children
+    widening_exponent: float = 0.5
+    use_solver: bool = False  # prove won and lost nodes, skip them in selection and stop the search once the root is proven
+    snapshot_dir: Optional[str] = None  # save the tree of every move below this directory, keeping only handles in memory
 
 
 @dataclass(frozen=True)
@@ -25,42 +63,519 @@ class BatchedGameSimulatorConfig(GameSimulatorConfig):
     print_full_tree_every_episode: bool = False
     print_full_tree_at_batch_end: bool = False
     print_only_chosen_tree_nodes: bool = False
-
-
-def rollout_evaluation(state_manager: StateManager, from_node: TreeNode, default_policy: DefaultPolicy) -> float:
+    batch_workers: int = 1  # > 1 runs episodes in a process pool of that size
+    batch_seed: Optional[int] = None  # episode i is seeded with batch_seed + i, making batches repeatable
+    keep_root_history: bool = True  # False drops the search trees of finished episodes
+
+
+@dataclass
+class SearchStats:
+    simulations: int = 0
+    tree_nodes: int = 1  # nodes in the search tree, including reused ones
+    elapsed: float = 0  # seconds
+    stop_reason: str = ""
+    profile: Optional[SimulationProfile] = None
+
+
+@dataclass
+class MoveStats:
+    simulations: int  # simulations performed to choose the move
+    reused_simulations: int = 0  # root visits carried over from the search of the previous move
+    tree_nodes: int = 0
+    elapsed: float = 0  # seconds spent searching
+    stop_reason: str = ""  # why the search budget stopped the search
+    transposition_hits: int = 0
+    transposition_misses: int = 0
+    profile: Optional[SimulationProfile] = None  # when GameSimulatorConfig.profile_simulations is set
+    player: int = -1  # the player making the move
+    chosen_child_index: int = -1  # index of the move made among the children of the root
+    root_child_traversals: List[int] = field(default_factory=list)  # visit distribution over the root children
+
+
+@dataclass
+class EpisodeResult:
+    state_history: List[GameState]  # the state history of the actual game played
+    root_history: List[Union[TreeNode, TreeSnapshotHandle]]  # handles when GameSimulatorConfig.snapshot_dir is set
+    move_stats: List[MoveStats]  # one entry per move made
+
+
+@dataclass
+class WinStatistics:
+    """Win counts aggregated one episode at a time, so memory does not grow with the number of games"""
+    games: int = 0
+    wins: List[int] = field(default_factory=lambda: [0, 0])  # wins of player 1 and player 2
+
+    def record(self, winner: int):
+        self.games += 1
+        self.wins[winner] += 1
+
+    def win_rate(self, player: int) -> float:
+        return self.wins[player] / self.games if self.games != 0 else 0
+
+
+def create_root_node(state: GameState, next_player: int, use_array_tree: bool = False,
+                     use_compact_tree: bool = False) -> TreeNode:
+    if use_array_tree and use_compact_tree:
+        raise ValueError("a tree cannot be both an array tree and a compact tree")
+    if use_array_tree:
+        return ArrayTree().create_root(state, next_player=next_player)
+    if use_compact_tree:
+        return CompactTreeNode(state, next_player=next_player)
+    return TreeNode(state, next_player=next_player)
+
+
+def create_action_state_manager(config: GameSimulatorConfig) -> ActionStateManager:
+    if isinstance(config.game_state_manager, ActionBackedStateManager):
+        return config.game_state_manager.action_state_manager
+    return SuccessorActionStateManager(config.game_state_manager)
+
+
+def create_search_root_node(config: GameSimulatorConfig, state: GameState, next_player: int) -> TreeNode:
+    if config.action_tree:
+        if config.use_array_tree or config.use_compact_tree:
+            raise ValueError("action trees are neither array trees nor compact trees")
+        return ActionTreeNode.create_root(state, next_player, create_action_state_manager(config))
+    return create_root_node(state, next_player, use_array_tree=config.use_array_tree,
+                            use_compact_tree=config.use_compact_tree)
+
+
+def rollout_evaluation(
+        state_manager: StateManager,
+        from_node: TreeNode,
+        default_policy: DefaultPolicy,
+        num_rollouts: int = 1,
+        profile: Optional[SimulationProfile] = None
+) -> float:
+    """
+    A single rollout following the default policy,
+    or the mean of num_rollouts uniformly random rollouts played at once by state_manager.batch_rollout
+    """
     state = from_node.game_state
-    player_won = rollout(state_manager, state, default_policy=default_policy)
+    if num_rollouts > 1:
+        players_won = state_manager.batch_rollout(state, num_rollouts)
+        return float(np.mean(np.where(players_won == 0, 1, -1)))
+
+    player_won = rollout(state_manager, state, default_policy=default_policy, profile=profile)
     return 1 if player_won == 0 else -1
 
 
-def perform_simulation(state_manager, root_node, tree_policy: TreePolicy, default_policy: DefaultPolicy):
+def solver_evaluation(
+        state_manager: StateManager,
+        leaf: TreeNode,
+        is_terminal: bool,
+        eval_node: TreeNode
+) -> Optional[float]:
+    """
+    Proves the terminal leaf, or the terminal children of the expanded leaf
+    Returns: the exact value of the evaluated node if it is proven, None if it needs a rollout
+    """
+    if is_terminal:
+        leaf.proven_winner = state_manager.player_won(leaf.game_state)
+    else:
+        prove_terminal_children(state_manager, leaf)
+        # a terminal child won by the player to move proves the leaf, even if another child is evaluated
+        update_proven_winner(leaf)
+    if eval_node.proven_winner is None:
+        return None
+    return 1 if eval_node.proven_winner == 0 else -1
+
+
+def perform_simulation(
+        state_manager,
+        root_node,
+        tree_policy: TreePolicy,
+        default_policy: DefaultPolicy,
+        transpositions: Optional[TranspositionTable] = None,
+        rollouts_per_leaf: int = 1,
+        profile: Optional[SimulationProfile] = None,
+        solver: bool = False
+) -> int:
     """
     Modifies the tree given by the root_node
+    With a transposition table the tree is a DAG, and values are propagated along the path actually searched
+    If a profile is given, the phases of the simulation are recorded into it
+    With the solver, proven nodes are valued exactly instead of by a rollout, and proofs are propagated up the tree
+    Returns: the number of child nodes added to the tree
     """
-    leaf = tree_search(root_node, tree_policy=tree_policy)
-    is_terminal = not expand_node(state_manager, leaf)
+    if profile is not None:
+        profile.start_simulation()
+
+    # the recorded edges are those actually searched, with transpositions nodes of the DAG may have other parents
+    edges, leaf = tree_search_edges(root_node, tree_policy=tree_policy)
+    depth = len(edges)
+    if profile is not None:
+        profile.lap('selection')
+
+    if transpositions is not None:
+        # children found in the table are already in the tree, only the misses are new nodes
+        misses = transpositions.misses
+        is_terminal = not expand_node(state_manager, leaf, transpositions=transpositions)
+        nodes_added = transpositions.misses - misses
+    else:
+        is_terminal = not expand_node(state_manager, leaf)
+        nodes_added = leaf.num_children()
 
     # pick an expanded node for rollout evaluation or the prior leaf node if it is terminal
-    eval_node = random.choice(leaf.get_children()) if not is_terminal else leaf
+    eval_node = leaf
+    if not is_terminal:
+        child_index = random.randrange(leaf.num_children())
+        eval_node = leaf.get_child(child_index)
+        edges.append((leaf, child_index))
+    value = solver_evaluation(state_manager, leaf, is_terminal, eval_node) if solver else None
+    if profile is not None:
+        profile.lap('expansion')
+        if not is_terminal:
+            profile.record_expansion(nodes_added)
+
+    if value is None:
+        value = rollout_evaluation(state_manager, eval_node, default_policy=default_policy,
+                                   num_rollouts=rollouts_per_leaf, profile=profile)
+    if profile is not None:
+        profile.lap('rollout')
+
+    backprop_edge_path(edges, eval_node, value)  # starts at the root node, which might have parents that we dont care about
+    if solver:
+        # an unproven evaluated child has no children that could prove it, the proofs start at its parent then
+        path = [node for node, _ in edges]
+        if eval_node.proven_winner is not None:
+            path.append(eval_node)
+        propagate_proven_winners(reversed(path))
+    if profile is not None:
+        profile.lap('backprop')
+        profile.end_simulation(depth=depth)
+
+    return nodes_added
+
+
+def perform_lazy_simulation(
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy,
+        default_policy: DefaultPolicy,
+        rollouts_per_leaf: int = 1,
+        widening_constant: float = 0,
+        widening_exponent: float = 0.5,
+        profile: Optional[SimulationProfile] = None
+) -> int:
+    """
+    Like perform_simulation, but adds at most one child to the tree, created by lazy_tree_search
+    Returns: the number of child nodes added to the tree
+    """
+    if profile is not None:
+        profile.start_simulation()
+
+    edges, eval_node = lazy_tree_search_edges(state_manager, root_node, tree_policy, widening_constant=widening_constant,
+                                              widening_exponent=widening_exponent)
+    nodes_added = 1 if eval_node.visits == 0 else 0  # else a terminal node already in the tree
+    if profile is not None:
+        profile.lap('selection')
+        if nodes_added != 0:
+            profile.record_expansion(1)
+
+    value = rollout_evaluation(state_manager, eval_node, default_policy=default_policy, num_rollouts=rollouts_per_leaf,
+                               profile=profile)
+    if profile is not None:
+        profile.lap('rollout')
 
-    value = rollout_evaluation(state_manager, eval_node, default_policy=default_policy)
-    backprop_node_value(eval_node, value, root_node=root_node)  # the root node might have parents that we dont care about
+    backprop_edge_path(edges, eval_node, value)
+    if profile is not None:
+        profile.lap('backprop')
+        profile.end_simulation(depth=len(edges))
+
+    return nodes_added
+
+
+def root_child_visits(state_manager: StateManager, root_node: TreeNode, chosen_child: TreeNode) -> Tuple[List[int], int]:
+    """
+    Returns: the traversals of the root edges in successor state order and the index of the chosen child in it.
+    Actions without a child, which lazy expansion never tried, have zero traversals
+    """
+    children = root_node.get_children()
+    edges = root_node.get_children_edges()
+    if len(children) == 0 or children[0].action_index is None:
+        return [edge.traversals for edge in edges], children.index(chosen_child)
+
+    traversals = [0] * state_manager.get_legal_action_count(root_node.game_state)
+    for child, edge in zip(children, edges):
+        traversals[child.action_index] = edge.traversals
+    return traversals, chosen_child.action_index
+
+
+def perform_batched_simulations(
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy,
+        leaf_evaluator: LeafEvaluator,
+        batch_size: int,
+        transpositions: Optional[TranspositionTable] = None,
+        virtual_loss: int = 1
+) -> int:
+    """
+    Performs batch_size simulations whose leaves are evaluated together by one call to leaf_evaluator.evaluate_batch.
+    Each descent adds virtual loss to its path, which steers the following descents of the batch to other leaves
+    Returns: the number of child nodes added to the tree
+    """
+    paths = []
+    nodes_added = 0
+    for i in range(batch_size):
+        edges, leaf = tree_search_edges(root_node, tree_policy=tree_policy)
+        misses = transpositions.misses if transpositions is not None else 0
+        if expand_node(state_manager, leaf, transpositions=transpositions):
+            # children found in the table are already in the tree
+            nodes_added += transpositions.misses - misses if transpositions is not None else leaf.num_children()
+            child_index = random.randrange(leaf.num_children())
+            edges.append((leaf, child_index))
+            leaf = leaf.get_child(child_index)
+        apply_virtual_loss(edges, leaf, virtual_loss)
+        paths.append((edges, leaf))
+
+    values = leaf_evaluator.evaluate_batch([leaf.game_state for _, leaf in paths])
+    for (edges, leaf), value in zip(paths, values):
+        revert_virtual_loss(edges, leaf, virtual_loss)
+        backprop_edge_path(edges, leaf, float(value))
+    return nodes_added
+
+
+def create_leaf_evaluator(config: GameSimulatorConfig) -> LeafEvaluator:
+    if config.leaf_evaluator is not None:
+        return config.leaf_evaluator
+    return RolloutLeafEvaluator(config.game_state_manager, num_rollouts=config.rollouts_per_leaf)
+
+
+def create_transposition_table(config: GameSimulatorConfig) -> Optional[TranspositionTable]:
+    if config.transposition_table_size <= 0:
+        return None
+    if config.use_array_tree:
+        raise ValueError("transposition tables are not supported by the array tree, its children must be contiguous")
+    return TranspositionTable(max_size=config.transposition_table_size,
+                              node_type=CompactTreeNode if config.use_compact_tree else TreeNode)
+
+
+def create_tree_policy(config: GameSimulatorConfig) -> TreePolicy:
+    return UctTreePolicy(uct_c=1, vectorized=config.vectorized_tree_policy, solver=config.use_solver)
+
+
+def create_search_budget(config: GameSimulatorConfig) -> SearchBudget:
+    if config.search_budget is not None:
+        return config.search_budget
+    return SimulationBudget(max_simulations=config.simulations_per_move)
+
+
+def perform_search(
+        config: GameSimulatorConfig,
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy,
+        default_policy: DefaultPolicy,
+        transpositions: Optional[TranspositionTable] = None
+) -> SearchStats:
+    """Performs simulations from the root node until the search budget of the config is spent"""
+    budget = create_search_budget(config)
+    stats = SearchStats(tree_nodes=count_tree_nodes(root_node, shared_nodes=transpositions is not None)
+                        if root_node.visits != 0 else 1)
+    profile = SimulationProfile() if config.profile_simulations else None
+    stats.profile = profile
+    # a leaf evaluator replaces the rollouts of perform_simulation, its leaves are evaluated in batches
+    batched = config.leaf_evaluator is not None or config.leaf_batch_size > 1
+    if batched and config.use_solver:
+        raise ValueError("the solver is not supported with a leaf evaluator or batched leaf evaluation")
+    if config.lazy_expansion and (batched or config.use_solver or config.use_array_tree or transpositions is not None):
+        raise ValueError("lazy expansion supports neither batched leaf evaluation, the solver, the array tree "
+                         "nor transposition tables")
+    if config.action_tree and (batched or config.use_solver or config.use_array_tree or transpositions is not None):
+        raise ValueError("action trees support neither batched leaf evaluation, the solver, the array tree "
+                         "nor transposition tables")
+    action_state_manager = create_action_state_manager(config) if config.action_tree else None
+    leaf_evaluator = create_leaf_evaluator(config) if batched else None
+    start_time = time.perf_counter()
+    while True:
+        stats.elapsed = time.perf_counter() - start_time
+        stop_reason = budget.stop_reason(root_node, stats.simulations, stats.tree_nodes, stats.elapsed)
+        if stop_reason is None and config.use_solver and root_node.proven_winner is not None:
+            stop_reason = "solved"
+        if stop_reason is not None:
+            stats.stop_reason = stop_reason
+            return stats
+
+        if batched:
+            remaining_simulations = budget.remaining_simulations(stats.simulations, stats.elapsed)
+            batch_size = config.leaf_batch_size if remaining_simulations is None \
+                else max(1, min(config.leaf_batch_size, math.ceil(remaining_simulations)))
+            stats.tree_nodes += perform_batched_simulations(state_manager, root_node, tree_policy, leaf_evaluator,
+                                                            batch_size, transpositions=transpositions,
+                                                            virtual_loss=config.virtual_loss)
+            stats.simulations += batch_size
+            continue
+
+        if config.action_tree:
+            stats.tree_nodes += perform_action_simulation(action_state_manager, root_node, tree_policy,
+                                                          rollouts_per_leaf=config.rollouts_per_leaf,
+                                                          widening_constant=config.widening_constant,
+                                                          widening_exponent=config.widening_exponent, profile=profile)
+            stats.simulations += 1
+            continue
+
+        if config.lazy_expansion:
+            stats.tree_nodes += perform_lazy_simulation(state_manager, root_node, tree_policy, default_policy,
+                                                        rollouts_per_leaf=config.rollouts_per_leaf,
+                                                        widening_constant=config.widening_constant,
+                                                        widening_exponent=config.widening_exponent, profile=profile)
+            stats.simulations += 1
+            continue
+
+        stats.tree_nodes += perform_simulation(state_manager, root_node, tree_policy, default_policy,
+                                               transpositions=transpositions, rollouts_per_leaf=config.rollouts_per_leaf,
+                                               profile=profile, solver=config.use_solver)
+        stats.simulations += 1
+
+
+def perform_threaded_search(
+        config: GameSimulatorConfig,
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy
+) -> SearchStats:
+    """Searches the tree of the root node with config.tree_parallel_workers threads until the search budget is spent"""
+    if config.use_array_tree or config.transposition_table_size > 0 or config.use_solver or config.lazy_expansion \
+            or config.action_tree:
+        raise ValueError("tree parallel search supports neither the array tree, transposition tables, the solver, "
+                         "lazy expansion nor action trees")
+
+    progress = perform_tree_parallel_search(state_manager, root_node, tree_policy, create_leaf_evaluator(config),
+                                            create_search_budget(config), config.tree_parallel_workers,
+                                            virtual_loss=config.virtual_loss)
+    return SearchStats(
+        simulations=progress.simulations,
+        tree_nodes=progress.tree_nodes,
+        elapsed=time.perf_counter() - progress.start_time,
+        stop_reason=progress.stop_reason
+    )
+
+
+def _root_parallel_worker_search(config: GameSimulatorConfig, state: GameState, next_player: int, seed: int) \
+        -> Tuple[List[Tuple[int, float, Optional[int]]], SearchStats]:
+    """
+    Runs in a worker process. Searches an independent tree from the given state
+    Returns: the (traversals, eval, proven winner) of every root edge, in successor state order,
+    and the stats of the search
+    """
+    random.seed(seed)
+    state_manager = config.game_state_manager
+    tree_policy = create_tree_policy(config)
+    default_policy = RandomDefaultPolicy(state_manager=state_manager)
+    transpositions = create_transposition_table(config)
+
+    root_node = create_search_root_node(config, state, next_player)
+    search_stats = perform_search(config, state_manager, root_node, tree_policy, default_policy, transpositions=transpositions)
+
+    root_edge_stats = [
+        (edge.traversals, edge.eval, child.proven_winner)
+        for child, edge in zip(root_node.get_children(), root_node.get_children_edges())
+    ]
+    children = root_node.get_children()
+    if len(children) != 0 and children[0].action_index is not None:
+        # lazily created children are in the order they were tried, and untried actions have none
+        lazy_root_edge_stats = root_edge_stats
+        root_edge_stats = [(0, 0, None)] * state_manager.get_legal_action_count(state)
+        for child, edge_stats in zip(children, lazy_root_edge_stats):
+            root_edge_stats[child.action_index] = edge_stats
+    return root_edge_stats, search_stats
+
+
+def merge_root_edge_stats(root_node: TreeNode, trees_root_edge_stats: List[List[Tuple[int, float, Optional[int]]]]):
+    """
+    Adds the root edge stats of independently searched trees to the edges of the given root node.
+    A child proven by the solver in any tree is proven in all of them, so the proofs are merged too
+    """
+    root_children = root_node.get_children()
+    root_edges = root_node.get_children_edges()
+    for root_edge_stats in trees_root_edge_stats:
+        if len(root_edge_stats) != len(root_edges):
+            raise ValueError("root edge stats do not match the children of the root node")
+        for child, edge, (traversals, eval, proven_winner) in zip(root_children, root_edges, root_edge_stats):
+            edge.traversals += traversals
+            edge.eval += eval
+            root_node.visits += traversals
+            if proven_winner is not None:
+                child.proven_winner = proven_winner
+
+    for edge in root_edges:
+        edge.q_value = edge.eval / edge.traversals if edge.traversals != 0 else 0
+    # children proven by different workers may prove the root together
+    update_proven_winner(root_node)
+
+
+def perform_root_parallel_search(
+        config: GameSimulatorConfig,
+        state_manager: StateManager,
+        root_node: TreeNode,
+        executor: ProcessPoolExecutor
+) -> SearchStats:
+    """
+    Searches the root node state in config.root_parallel_workers processes, each with its own tree and seed,
+    and merges the root edge stats into the given root node
+    Returns: the summed simulations and tree nodes of the workers, and the stop reason of the slowest one
+    """
+    start_time = time.perf_counter()
+    if len(root_node.get_children()) == 0:
+        if isinstance(root_node, ActionTreeNode):
+            expand_action_node(create_action_state_manager(config), root_node)
+        else:
+            expand_node(state_manager, root_node)
+
+    futures = [
+        executor.submit(_root_parallel_worker_search, config, root_node.game_state, root_node.next_player, random.getrandbits(32))
+        for i in range(config.root_parallel_workers)
+    ]
+    results = [future.result() for future in futures]
+    merge_root_edge_stats(root_node, [root_edge_stats for root_edge_stats, _ in results])
+
+    workers_stats = [search_stats for _, search_stats in results]
+    profile = None
+    if config.profile_simulations:
+        profile = SimulationProfile()
+        for stats in workers_stats:
+            profile.merge(stats.profile)
+
+    return SearchStats(
+        simulations=sum(stats.simulations for stats in workers_stats),
+        tree_nodes=sum(stats.tree_nodes for stats in workers_stats),
+        elapsed=time.perf_counter() - start_time,
+        stop_reason=max(workers_stats, key=lambda stats: stats.elapsed).stop_reason,
+        profile=profile
+    )
 
 
 def perform_episode(config: GameSimulatorConfig) -> Tuple[List[GameState], List[TreeNode]]:
-    simulations_per_move = config.simulations_per_move
+    result = run_episode(config)
+    return result.state_history, result.root_history
+
+
+def run_episode(config: GameSimulatorConfig) -> EpisodeResult:
+    """Like perform_episode, but also returns statistics about every move"""
+    if config.root_parallel_workers > 1:
+        with ProcessPoolExecutor(max_workers=config.root_parallel_workers) as executor:
+            return _run_episode(config, executor)
+    return _run_episode(config)
+
+
+def _run_episode(config: GameSimulatorConfig, executor: Optional[ProcessPoolExecutor] = None) -> EpisodeResult:
     verbose = config.verbose
     do_print_tree = config.print_tree_every_move
     starting_player = config.starting_player if (0 <= config.starting_player <= 1) else random.randint(0, 1)
 
     state_manager = config.game_state_manager  # _create_state_manager(config, override_starting_player=starting_player) if state_manager is None else state_manager
-    tree_policy = UctTreePolicy(uct_c=1)
+    tree_policy = create_tree_policy(config)
     default_policy = RandomDefaultPolicy(state_manager=state_manager)
+    transpositions = create_transposition_table(config)
 
-    absolute_root_node = TreeNode(state_manager.get_initial_state(), next_player=starting_player)
+    absolute_root_node = create_search_root_node(config, state_manager.get_initial_state(), starting_player)
     curr_root_node = absolute_root_node
     state_history = []  # the state history of the actual game played
     root_history = []
+    move_stats = []
+    episode_snapshot_dir = os.path.join(config.snapshot_dir, f"episode_{uuid.uuid4().hex}") \
+        if config.snapshot_dir is not None else None
 
     while True:
         state_history.append(curr_root_node.game_state)
@@ -72,22 +587,144 @@ def perform_episode(config: GameSimulatorConfig) -> Tuple[List[GameState], List[
             print(action_str)
 
         if state_manager.is_terminal_state(curr_root_node.game_state):
+            if episode_snapshot_dir is not None:
+                root_history[-1] = _save_move_snapshot(episode_snapshot_dir, len(root_history) - 1, curr_root_node, state_manager)
             break
 
-        for i in range(simulations_per_move):
-            perform_simulation(state_manager, curr_root_node, tree_policy, default_policy)
+        reused_simulations = curr_root_node.visits
+        transposition_hits = transpositions.hits if transpositions is not None else 0
+        transposition_misses = transpositions.misses if transpositions is not None else 0
+        if executor is not None:
+            search_stats = perform_root_parallel_search(config, state_manager, curr_root_node, executor)
+        elif config.tree_parallel_workers > 1:
+            search_stats = perform_threaded_search(config, state_manager, curr_root_node, tree_policy)
+        else:
+            search_stats = perform_search(config, state_manager, curr_root_node, tree_policy, default_policy,
+                                          transpositions=transpositions)
+
+        move_stats.append(MoveStats(
+            simulations=search_stats.simulations,
+            player=curr_root_node.next_player,
+            reused_simulations=reused_simulations,
+            tree_nodes=search_stats.tree_nodes,
+            elapsed=search_stats.elapsed,
+            stop_reason=search_stats.stop_reason,
+            profile=search_stats.profile,
+            transposition_hits=transpositions.hits - transposition_hits if transpositions is not None else 0,
+            transposition_misses=transpositions.misses - transposition_misses if transpositions is not None else 0
+        ))
 
         # choose next root node
         # corresponding to making an actual move
         next_root_node_in_tree = follow_most_traversed_child_edge(curr_root_node)
-        next_root_node = next_root_node_in_tree.copy_and_remove_tree()
+        move_stats[-1].root_child_traversals, move_stats[-1].chosen_child_index = \
+            root_child_visits(state_manager, curr_root_node, next_root_node_in_tree)
 
         if do_print_tree:
             print_tree(curr_root_node, highlight_nodes=[next_root_node_in_tree])
 
+        if episode_snapshot_dir is not None:
+            # saved before the tree is pruned, the live tree of this move can then be freed
+            root_history[-1] = _save_move_snapshot(episode_snapshot_dir, len(root_history) - 1, curr_root_node, state_manager)
+
+        if config.reuse_tree:
+            if transpositions is not None:
+                # a shared node's parent is the last node expanded to it, the edge to cut is the one from the root
+                next_root_node_in_tree.parent = curr_root_node
+            next_root_node = next_root_node_in_tree.promote_to_root()
+            if transpositions is not None:
+                transpositions.retain_subtree(next_root_node)
+        else:
+            next_root_node = next_root_node_in_tree.copy_and_remove_tree()
+            if transpositions is not None:
+                # the old tree is discarded, its nodes must not be shared with the new one
+                transpositions.clear()
+
         curr_root_node = next_root_node
 
-    return state_history, root_history
+    return EpisodeResult(state_history=state_history, root_history=root_history, move_stats=move_stats)
+
+
+def _save_move_snapshot(episode_snapshot_dir: str, move: int, root_node: TreeNode,
+                        state_manager: StateManager) -> TreeSnapshotHandle:
+    return save_tree_snapshot(root_node, os.path.join(episode_snapshot_dir, f"move_{move:04d}"), state_manager)
+
+
+def _perform_seeded_episode(config: BatchedGameSimulatorConfig, seed: int) -> EpisodeResult:
+    random.seed(seed)
+    result = run_episode(config)
+    if not config.keep_root_history:
+        result.root_history = []
+    return result
+
+
+def iter_episodes(config: BatchedGameSimulatorConfig) -> Iterator[Tuple[int, EpisodeResult]]:
+    """
+    Runs config.batch_size episodes, in a process pool if config.batch_workers > 1
+    Yields: (episode index, result) of each episode as soon as it finishes, nothing is kept after it is yielded
+    """
+    seeds = [
+        config.batch_seed + i if config.batch_seed is not None else random.getrandbits(32)
+        for i in range(config.batch_size)
+    ]
+
+    if config.batch_workers <= 1:
+        for i, seed in enumerate(seeds):
+            print(f"Starting batch {i}")
+            yield i, _perform_seeded_episode(config, seed)
+        return
+
+    # at most two episodes per worker are in flight, so finished results do not pile up in the pool
+    max_in_flight = 2 * config.batch_workers
+    pending_seeds = iter(enumerate(seeds))
+    with ProcessPoolExecutor(max_workers=config.batch_workers) as executor:
+        future_to_index = {
+            executor.submit(_perform_seeded_episode, config, seed): i
+            for i, seed in islice(pending_seeds, max_in_flight)
+        }
+        while len(future_to_index) != 0:
+            done, _ = wait(future_to_index, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = future_to_index.pop(future)
+                for next_i, seed in islice(pending_seeds, 1):
+                    future_to_index[executor.submit(_perform_seeded_episode, config, seed)] = next_i
+                print(f"Finished batch {i}")
+                yield i, future.result()
+
+
+def iter_batch_episodes(config: BatchedGameSimulatorConfig) -> Iterator[Tuple[int, List[GameState], List[TreeNode]]]:
+    """Yields: (episode index, state history, root node history) of each episode as soon as it finishes"""
+    for i, result in iter_episodes(config):
+        yield i, result.state_history, result.root_history
+
+
+def stream_batch_run(config: BatchedGameSimulatorConfig,
+                     sink: Optional[Callable[[int, EpisodeResult], None]] = None) -> WinStatistics:
+    """
+    Runs the batch without keeping finished episodes, passing each one to the sink as it finishes
+    Returns: the win statistics of the batch
+    """
+    # a state manager to evaluate player_won, hence starting player is not important
+    state_manager = config.game_state_manager
+    win_statistics = WinStatistics()
+    for i, result in iter_episodes(config):
+        win_statistics.record(state_manager.player_won(result.state_history[-1]))
+        if sink is not None:
+            sink(i, result)
+    return win_statistics
+
+
+def _print_episode_tree(config: GameSimulatorConfig, root_node_history: List[Union[TreeNode, TreeSnapshotHandle]],
+                        print_only_highlighted: bool):
+    if isinstance(root_node_history[0], TreeSnapshotHandle):
+        # every move is a separate snapshot, the chosen nodes can only be highlighted in the first one
+        root_node = root_node_history[0].load(config.game_state_manager).root
+        chosen_nodes = [root_node]
+        if len(root_node_history) > 1:
+            chosen_nodes.append(follow_most_traversed_child_edge(root_node))
+        print_tree(root_node, highlight_nodes=chosen_nodes, print_only_highlighted=print_only_highlighted)
+    else:
+        print_tree(root_node_history[0], highlight_nodes=root_node_history, print_only_highlighted=print_only_highlighted)
 
 
 def perform_batch_run(config: BatchedGameSimulatorConfig) -> Tuple[float, List[List[GameState]], List[List[TreeNode]]]:
@@ -95,37 +732,39 @@ def perform_batch_run(config: BatchedGameSimulatorConfig) -> Tuple[float, List[L
     print_full_tree_at_end = config.print_full_tree_at_batch_end
     print_only_chosen_tree_nodes = config.print_only_chosen_tree_nodes
 
-    games_history = []
-    games_root_history = []
+    # episodes may finish out of order, results are kept in episode order
+    games_history = [[] for i in range(config.batch_size)]
+    games_root_history = [[] for i in range(config.batch_size)]
 
-    for i in range(config.batch_size):
-        print(f"Starting batch {i}")
-        state_history, root_node_history = perform_episode(config)
-        games_history.append(state_history)
-        games_root_history.append(root_node_history)
+    def keep_episode(i: int, result: EpisodeResult):
+        games_history[i] = result.state_history
+        games_root_history[i] = result.root_history
 
-        if print_full_tree_every_episode:
-            print_tree(root_node_history[0], highlight_nodes=root_node_history, print_only_highlighted=print_only_chosen_tree_nodes)
+        if print_full_tree_every_episode and len(result.root_history) > 0:
+            _print_episode_tree(config, result.root_history, print_only_chosen_tree_nodes)
 
-    if print_full_tree_at_end:
-        last_root_node_history = games_root_history[-1]
-        print_tree(last_root_node_history[0], highlight_nodes=last_root_node_history, print_only_highlighted=print_only_chosen_tree_nodes)
-
-    # a state manager to evaluate player_won, hence starting player is not important
-    state_manager = config.game_state_manager
+    win_statistics = stream_batch_run(config, sink=keep_episode)
 
-    total_games = len(games_history)
-    p2_wins = sum([
-        state_manager.player_won(game[-1])
-        for game in games_history
-    ])
-    p1_wins = total_games - p2_wins
-    p1_win_percentage = p1_wins / total_games
+    if print_full_tree_at_end and len(games_root_history[-1]) > 0:
+        _print_episode_tree(config, games_root_history[-1], print_only_chosen_tree_nodes)
 
-    print(f"Player 1 wins {p1_wins} of {total_games} ({p1_win_percentage})")
+    print(f"Player 1 wins {win_statistics.wins[0]} of {win_statistics.games} ({win_statistics.win_rate(0)})")
 
-    return p1_win_percentage, games_history, games_root_history
+    return win_statistics.win_rate(0), games_history, games_root_history
 
 
 if __name__ == '__main__':
-    pass
+    from mcts.test_games.nim_state_manager import NimStateManager
+
+    def check_solver_proves_winning_move():
+        # taking all 3 pieces wins, the root must be proven by the first simulation whichever child it evaluates
+        for seed in range(20):
+            random.seed(seed)
+            state_manager = NimStateManager(3, 3, 0)
+            root_node = create_root_node(state_manager.get_initial_state(), 0)
+            perform_simulation(state_manager, root_node, create_tree_policy(GameSimulatorConfig(state_manager)),
+                               RandomDefaultPolicy(state_manager=state_manager), solver=True)
+            if root_node.proven_winner != 0:
+                raise AssertionError(f"root with a terminal winning child is not proven, seed {seed}")
+
+    check_solver_proves_winning_move()
@@ -0,0 +1,161 @@
+import random
+from typing import Optional
+
+from mcts.mcts_core.action_state_manager import ActionStateManager, Action, InPlaceActionStateManager
+from mcts.mcts_core.mc_profiling import SimulationProfile
+from mcts.mcts_core.mc_tree import TreeNode
+from mcts.mcts_core.mc_tree_funcs import TreePolicy, _can_widen, backprop_edge_path
+from mcts.mcts_core.state_manager import GameState
+
+
+class ActionTreeNode(TreeNode):
+    """
+    A tree node holding the action leading to it instead of its game state.
+    Only a root holds its state and the action state manager, the state of any other node is created
+    from the actions on its path when game_state is read
+    """
+
+    def __init__(self, action: Optional[Action] = None, state: Optional[GameState] = None,
+                 next_player: Optional[int] = None, action_state_manager: Optional[ActionStateManager] = None):
+        self.action = action  # read only, None for a root
+        self.action_state_manager = action_state_manager  # only set on a root
+        super().__init__(state, next_player)
+
+    @staticmethod
+    def create_root(state: GameState, next_player: int, action_state_manager: ActionStateManager) -> 'ActionTreeNode':
+        return ActionTreeNode(state=state, next_player=next_player, action_state_manager=action_state_manager)
+
+    @property
+    def game_state(self) -> GameState:
+        if self.parent is None:
+            return self._root_state
+        actions = []
+        node = self
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        state = node._root_state
+        for action in reversed(actions):
+            state = node.action_state_manager.apply(state, action)
+        return state
+
+    @game_state.setter
+    def game_state(self, state: GameState):
+        self._root_state = state
+
+    def get_action_state_manager(self) -> ActionStateManager:
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node.action_state_manager
+
+    def copy_and_remove_tree(self):
+        return ActionTreeNode.create_root(self.game_state, self.next_player, self.get_action_state_manager())
+
+    def promote_to_root(self) -> 'ActionTreeNode':
+        if self.parent is not None:
+            # the state and manager must be taken from the path before the node is detached from it
+            state = self.game_state
+            action_state_manager = self.get_action_state_manager()
+            super().promote_to_root()
+            self._root_state = state
+            self.action_state_manager = action_state_manager
+        return self
+
+
+def expand_action_node(action_state_manager: ActionStateManager, node: ActionTreeNode) -> bool:
+    """
+    Adds a child for every legal action at once, in action order
+    Returns: false if the node is terminal
+    """
+    state = node.game_state
+    if action_state_manager.is_terminal_state(state):
+        return False
+    for action_index, action in enumerate(action_state_manager.legal_actions(state)):
+        child = ActionTreeNode(action)
+        child.action_index = action_index
+        node.add_child(child)
+    node.untried_actions = []
+    return True
+
+
+def perform_action_simulation(
+        action_state_manager: ActionStateManager,
+        root_node: ActionTreeNode,
+        tree_policy: TreePolicy,
+        rollouts_per_leaf: int = 1,
+        widening_constant: float = 0,
+        widening_exponent: float = 0.5,
+        profile: Optional[SimulationProfile] = None
+) -> int:
+    """
+    Like perform_lazy_simulation on a tree of ActionTreeNode. The state is carried along the descent by applying
+    the action of every node reached, in place in the root state for an InPlaceActionStateManager, in which case
+    the rollouts are in place too and every action is undone at the end, so a simulation allocates no state
+    Returns: the number of child nodes added to the tree
+    """
+    if profile is not None:
+        profile.start_simulation()
+
+    in_place = isinstance(action_state_manager, InPlaceActionStateManager)
+    state = root_node.game_state
+    undo_stack = []
+
+    def apply(action: Action):
+        nonlocal state
+        if in_place:
+            undo_stack.append((action, action_state_manager.apply_in_place(state, action)))
+        else:
+            state = action_state_manager.apply(state, action)
+
+    node = root_node
+    edges = []
+    nodes_added = 0
+    try:
+        while True:
+            if node.untried_actions is None:
+                if action_state_manager.is_terminal_state(state):
+                    break
+                node.untried_actions = list(range(len(action_state_manager.legal_actions(state))))
+                random.shuffle(node.untried_actions)
+
+            if len(node.untried_actions) != 0 and _can_widen(node, widening_constant, widening_exponent):
+                action_index = node.untried_actions.pop()
+                child = ActionTreeNode(action_state_manager.legal_actions(state)[action_index])
+                child.action_index = action_index
+                node.add_child(child)
+                edges.append((node, node.num_children() - 1))
+                apply(child.action)
+                node = child
+                nodes_added = 1
+                break
+
+            index, child = tree_policy.follow_policy_edge(node)
+            edges.append((node, index))
+            node = child
+            apply(node.action)
+        if profile is not None:
+            profile.lap('selection')
+            if nodes_added != 0:
+                profile.record_expansion(1)
+
+        if action_state_manager.is_terminal_state(state):
+            value = 1 if action_state_manager.player_won(state) == 0 else -1
+        else:
+            value = sum(
+                1 if action_state_manager.rollout(state) == 0 else -1
+                for i in range(rollouts_per_leaf)
+            ) / rollouts_per_leaf
+    finally:
+        # the root state is restored even if the descent or a rollout raises
+        for action, undo_info in reversed(undo_stack):
+            action_state_manager.undo(state, action, undo_info)
+    if profile is not None:
+        profile.lap('rollout')
+
+    backprop_edge_path(edges, node, value)
+    if profile is not None:
+        profile.lap('backprop')
+        profile.end_simulation(depth=len(edges))
+
+    return nodes_added
@@ -0,0 +1,285 @@
+from typing import List, Optional, Tuple, Iterator
+
+import numpy as np
+
+from mcts.mcts_core.state_manager import GameState
+from mcts.mcts_core.utils import two_player_other_player
+
+
+class ArrayTree:
+    """
+    Struct-of-arrays storage of a whole search tree.
+    Every node is an index into flat preallocated arrays, and the stats of the edge leading into a node
+    are stored at the index of that node. Children of a node occupy a contiguous index range.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self.game_states: List[GameState] = []
+        self.visits = np.zeros(capacity, dtype=np.int64)
+        self.next_player = np.full(capacity, -1, dtype=np.int8)
+        self.parent = np.full(capacity, -1, dtype=np.int64)
+        self.first_child = np.full(capacity, -1, dtype=np.int64)
+        self.num_children = np.zeros(capacity, dtype=np.int64)
+        self.proven_winner = np.full(capacity, -1, dtype=np.int8)  # -1 if the node is not proven
+        # stats of the edge from the parent to the node
+        self.traversals = np.zeros(capacity, dtype=np.int64)
+        self.eval = np.zeros(capacity, dtype=np.float64)
+        self.q_value = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self.visits.shape[0]
+
+    def _reserve(self, size: int):
+        if size <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+
+        def grown(array: np.ndarray, fill) -> np.ndarray:
+            new_array = np.full(capacity, fill, dtype=array.dtype)
+            new_array[:self._size] = array[:self._size]
+            return new_array
+
+        self.visits = grown(self.visits, 0)
+        self.next_player = grown(self.next_player, -1)
+        self.parent = grown(self.parent, -1)
+        self.first_child = grown(self.first_child, -1)
+        self.num_children = grown(self.num_children, 0)
+        self.proven_winner = grown(self.proven_winner, -1)
+        self.traversals = grown(self.traversals, 0)
+        self.eval = grown(self.eval, 0)
+        self.q_value = grown(self.q_value, 0)
+
+    def create_root(self, state: GameState, next_player: Optional[int] = None) -> 'ArrayTreeNode':
+        if self._size != 0:
+            raise ValueError("the tree already has a root")
+        self._reserve(1)
+        self._size = 1
+        self.game_states.append(state)
+        self.next_player[0] = -1 if next_player is None else next_player
+        return ArrayTreeNode(self, 0)
+
+    def add_children(self, parent_index: int, states: List[GameState]) -> range:
+        """Allocates a contiguous block of child nodes for the given states. Returns their indices"""
+        if self.num_children[parent_index] != 0:
+            raise ValueError("children of an array tree node can only be added once")
+        start = self._size
+        end = start + len(states)
+        self._reserve(end)
+        self._size = end
+        self.game_states.extend(states)
+        self.parent[start:end] = parent_index
+        parent_next_player = self.next_player[parent_index]
+        self.next_player[start:end] = -1 if parent_next_player == -1 else two_player_other_player(int(parent_next_player))
+        self.first_child[parent_index] = start
+        self.num_children[parent_index] = len(states)
+        return range(start, end)
+
+    def children_range(self, index: int) -> range:
+        start = int(self.first_child[index])
+        return range(start, start + int(self.num_children[index])) if start != -1 else range(0)
+
+    def backprop(self, from_index: int, value: float, root_index: int = 0):
+        """Adds the value to every edge from root_index down to from_index"""
+        path = [from_index]
+        index = from_index
+        while index != root_index and self.parent[index] != -1:
+            index = int(self.parent[index])
+            path.append(index)
+
+        self.visits[path] += 1
+        # the edge stats of a node belong to the edge from its parent, hence the top node is not updated
+        edges = path[:-1]
+        self.traversals[edges] += 1
+        self.eval[edges] += value
+        self.q_value[edges] = self.eval[edges] / self.traversals[edges]
+
+    def extract_subtree(self, index: int) -> 'ArrayTree':
+        """Copies the subtree rooted at the given index, with all its statistics, into a new compact tree"""
+        subtree = ArrayTree(capacity=self.capacity)
+        subtree.create_root(self.game_states[index], next_player=int(self.next_player[index]))
+        subtree.visits[0] = self.visits[index]
+        subtree.proven_winner[0] = self.proven_winner[index]
+
+        # breadth first copy keeps the children of every node contiguous
+        queue = [(index, 0)]
+        for old_index, new_index in queue:
+            children = self.children_range(old_index)
+            if len(children) == 0:
+                continue
+            new_children = subtree.add_children(new_index, self.game_states[children.start:children.stop])
+            for array_name in ('visits', 'next_player', 'proven_winner', 'traversals', 'eval', 'q_value'):
+                getattr(subtree, array_name)[new_children.start:new_children.stop] = \
+                    getattr(self, array_name)[children.start:children.stop]
+            queue.extend(zip(children, new_children))
+
+        return subtree
+
+    def node(self, index: int) -> 'ArrayTreeNode':
+        return ArrayTreeNode(self, index)
+
+
+class ArrayTreeNodeChildEdge:
+    """A view of the stats of the edge leading into a node of an ArrayTree"""
+    __slots__ = ('_tree', '_index')
+
+    def __init__(self, tree: ArrayTree, index: int):
+        self._tree = tree
+        self._index = index
+
+    @property
+    def q_value(self) -> float:
+        return float(self._tree.q_value[self._index])
+
+    @q_value.setter
+    def q_value(self, q_value: float):
+        self._tree.q_value[self._index] = q_value
+
+    @property
+    def traversals(self) -> int:
+        return int(self._tree.traversals[self._index])
+
+    @traversals.setter
+    def traversals(self, traversals: int):
+        self._tree.traversals[self._index] = traversals
+
+    @property
+    def eval(self) -> float:
+        return float(self._tree.eval[self._index])
+
+    @eval.setter
+    def eval(self, eval: float):
+        self._tree.eval[self._index] = eval
+
+    def __str__(self):
+        return f"[e={self.eval} t={self.traversals} q={'%.3f' % self.q_value}]"
+
+
+class ArrayTreeNode:
+    """
+    A handle to a node of an ArrayTree, exposing the same interface as TreeNode.
+    Handles are cheap to create, two handles are equal if they point to the same node.
+    """
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree: ArrayTree, index: int):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def game_state(self) -> GameState:
+        return self.tree.game_states[self.index]
+
+    @property
+    def visits(self) -> int:
+        return int(self.tree.visits[self.index])
+
+    @visits.setter
+    def visits(self, visits: int):
+        self.tree.visits[self.index] = visits
+
+    @property
+    def next_player(self) -> Optional[int]:
+        next_player = int(self.tree.next_player[self.index])
+        return next_player if next_player != -1 else None
+
+    @next_player.setter
+    def next_player(self, next_player: Optional[int]):
+        self.tree.next_player[self.index] = -1 if next_player is None else next_player
+
+    @property
+    def proven_winner(self) -> Optional[int]:
+        proven_winner = int(self.tree.proven_winner[self.index])
+        return proven_winner if proven_winner != -1 else None
+
+    @proven_winner.setter
+    def proven_winner(self, proven_winner: Optional[int]):
+        self.tree.proven_winner[self.index] = -1 if proven_winner is None else proven_winner
+
+    @property
+    def action_index(self) -> Optional[int]:
+        # array trees are always fully expanded, children are in successor state order
+        return None
+
+    @property
+    def untried_actions(self) -> Optional[List[int]]:
+        # array trees are always fully expanded
+        return None
+
+    @property
+    def parent(self) -> Optional['ArrayTreeNode']:
+        parent_index = int(self.tree.parent[self.index])
+        return ArrayTreeNode(self.tree, parent_index) if parent_index != -1 else None
+
+    def add_children_from_states(self, states: List[GameState]):
+        self.tree.add_children(self.index, states)
+
+    def num_children(self) -> int:
+        return int(self.tree.num_children[self.index])
+
+    def iter_children(self) -> Iterator['ArrayTreeNode']:
+        return (ArrayTreeNode(self.tree, i) for i in self.tree.children_range(self.index))
+
+    def iter_children_edge_stats(self) -> Iterator[Tuple['ArrayTreeNode', float, int]]:
+        children = self.tree.children_range(self.index)
+        return zip(self.iter_children(), self.tree.q_value[children.start:children.stop].tolist(),
+                   self.tree.traversals[children.start:children.stop].tolist())
+
+    def get_children(self) -> List['ArrayTreeNode']:
+        return [ArrayTreeNode(self.tree, i) for i in self.tree.children_range(self.index)]
+
+    def get_children_edges(self) -> List[ArrayTreeNodeChildEdge]:
+        return [ArrayTreeNodeChildEdge(self.tree, i) for i in self.tree.children_range(self.index)]
+
+    def get_child(self, index: int) -> 'ArrayTreeNode':
+        return ArrayTreeNode(self.tree, int(self.tree.first_child[self.index]) + index)
+
+    def get_children_edge_stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the q_values and traversals of the child edges as array views"""
+        children = self.tree.children_range(self.index)
+        return self.tree.q_value[children.start:children.stop], self.tree.traversals[children.start:children.stop]
+
+    def add_to_edge(self, index: int, traversals: int, eval: float):
+        """Adds traversals and their summed eval to the edge to the child at the index, and updates its q_value"""
+        tree = self.tree
+        child = int(tree.first_child[self.index]) + index
+        edge_traversals = int(tree.traversals[child]) + traversals
+        edge_eval = float(tree.eval[child]) + eval
+        tree.traversals[child] = edge_traversals
+        tree.eval[child] = edge_eval
+        tree.q_value[child] = edge_eval / edge_traversals if edge_traversals != 0 else 0
+
+    def get_edge_to_child(self, child: 'ArrayTreeNode') -> ArrayTreeNodeChildEdge:
+        if child.tree is not self.tree or self.tree.parent[child.index] != self.index:
+            raise ValueError("trying to retrieve child edge of a non-existing child")
+        return ArrayTreeNodeChildEdge(self.tree, child.index)
+
+    def add_to_child_edge(self, child: 'ArrayTreeNode', traversals: int, eval: float):
+        """Like add_to_edge, for the edge to the given child"""
+        self.get_edge_to_child(child)
+        self.add_to_edge(child.index - int(self.tree.first_child[self.index]), traversals, eval)
+
+    def copy_and_remove_tree(self) -> 'ArrayTreeNode':
+        return ArrayTree(capacity=self.tree.capacity).create_root(self.game_state, next_player=self.next_player)
+
+    def promote_to_root(self) -> 'ArrayTreeNode':
+        """Returns the root of a compact copy of the subtree of this node, keeping all its statistics"""
+        return ArrayTreeNode(self.tree.extract_subtree(self.index), 0)
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayTreeNode) and other.tree is self.tree and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __str__(self):
+        return f"(visits={self.visits} next_player={self.next_player} state={self.game_state})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,5 +1,3 @@
-import random
-
 from mcts.mcts_core.mc_tree_funcs import DefaultPolicy
 from mcts.mcts_core.state_manager import StateManager, GameState
 
@@ -9,4 +7,4 @@ class RandomDefaultPolicy(DefaultPolicy):
         self._state_manager = state_manager
 
     def follow_policy(self, state: GameState) -> GameState:
-        return random.choice(self._state_manager.get_successor_states(state))
+        return self._state_manager.sample_successor_state(state)
@@ -0,0 +1,47 @@
+import json
+from typing import Dict, Any, TextIO, Optional
+
+from mcts.mcts_core.game_simulator import EpisodeResult
+from mcts.mcts_core.state_manager import StateManager
+
+
+def episode_record(index: int, result: EpisodeResult, state_manager: StateManager) -> Dict[str, Any]:
+    """A json serializable summary of an episode, states are hex encoded with the serialize_state of the state manager"""
+    return {
+        'episode': index,
+        'winner': state_manager.player_won(result.state_history[-1]),
+        'states': [state_manager.serialize_state(state).hex() for state in result.state_history],
+        'chosen_child_indices': [stats.chosen_child_index for stats in result.move_stats],
+        'root_child_traversals': [stats.root_child_traversals for stats in result.move_stats],
+        'simulations': [stats.simulations for stats in result.move_stats]
+    }
+
+
+class JsonlEpisodeSink:
+    """
+    A sink for stream_batch_run appending one json line per finished episode to a file.
+    Every line is flushed when written, so the file stays readable if a run is interrupted
+    """
+
+    def __init__(self, path: str, state_manager: StateManager):
+        self.path = path
+        self._state_manager = state_manager
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self) -> 'JsonlEpisodeSink':
+        self._file = open(self.path, 'a')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __call__(self, index: int, result: EpisodeResult):
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps(episode_record(index, result, self._state_manager)) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
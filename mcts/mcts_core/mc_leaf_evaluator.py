@@ -0,0 +1,83 @@
+from typing import Callable, List
+
+import numpy as np
+
+from mcts.mcts_core.mc_default_policy import RandomDefaultPolicy
+from mcts.mcts_core.mc_tree_funcs import LeafEvaluator, rollout
+from mcts.mcts_core.state_manager import StateManager, GameState
+
+
+def terminal_value(state_manager: StateManager, state: GameState) -> float:
+    return 1 if state_manager.player_won(state) == 0 else -1
+
+
+class RolloutLeafEvaluator(LeafEvaluator):
+    """
+    The value of a random rollout from the state,
+    or the mean of num_rollouts uniformly random rollouts played at once by state_manager.batch_rollout
+    """
+
+    def __init__(self, state_manager: StateManager, num_rollouts: int = 1):
+        self._state_manager = state_manager
+        self._default_policy = RandomDefaultPolicy(state_manager=state_manager)
+        self.num_rollouts = num_rollouts
+
+    def evaluate(self, state: GameState) -> float:
+        if self.num_rollouts > 1:
+            players_won = self._state_manager.batch_rollout(state, self.num_rollouts)
+            return float(np.mean(np.where(players_won == 0, 1, -1)))
+
+        player_won = rollout(self._state_manager, state, default_policy=self._default_policy)
+        return 1 if player_won == 0 else -1
+
+
+class HeuristicLeafEvaluator(LeafEvaluator):
+    """A handwritten evaluation of non-terminal states, clipped to [-1, 1]. Terminal states get their exact value"""
+
+    def __init__(self, state_manager: StateManager, heuristic: Callable[[GameState], float]):
+        self._state_manager = state_manager
+        self.heuristic = heuristic
+
+    def evaluate(self, state: GameState) -> float:
+        if self._state_manager.is_terminal_state(state):
+            return terminal_value(self._state_manager, state)
+        return min(max(self.heuristic(state), -1), 1)
+
+
+class ModelLeafEvaluator(LeafEvaluator):
+    """
+    Evaluates non-terminal states with a value model, called once per batch on the stacked encode_state of the states.
+    Terminal states get their exact value
+    """
+
+    def __init__(self, state_manager: StateManager, model: Callable[[np.ndarray], np.ndarray]):
+        self._state_manager = state_manager
+        self.model = model
+
+    def evaluate(self, state: GameState) -> float:
+        return float(self.evaluate_batch([state])[0])
+
+    def evaluate_batch(self, states: List[GameState]) -> np.ndarray:
+        values = np.empty(len(states), dtype=np.float64)
+        non_terminal = []
+        for i, state in enumerate(states):
+            if self._state_manager.is_terminal_state(state):
+                values[i] = terminal_value(self._state_manager, state)
+            else:
+                non_terminal.append(i)
+
+        if len(non_terminal) != 0:
+            encoded_states = np.stack([self._state_manager.encode_state(states[i]) for i in non_terminal])
+            values[non_terminal] = np.clip(self.model(encoded_states), -1, 1)
+        return values
+
+
+class LinearValueModel:
+    """tanh(features @ weights + bias), a value function cheap enough to evaluate on the cpu"""
+
+    def __init__(self, weights: np.ndarray, bias: float = 0):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = bias
+
+    def __call__(self, encoded_states: np.ndarray) -> np.ndarray:
+        return np.tanh(encoded_states.astype(np.float64) @ self.weights + self.bias)
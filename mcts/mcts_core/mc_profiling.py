@@ -0,0 +1,90 @@
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+SIMULATION_PHASES = ('selection', 'expansion', 'rollout', 'backprop')
+
+
+@dataclass
+class SimulationProfile:
+    """
+    Opt-in instrumentation of perform_simulation, collecting phase timings and the shape of the search.
+    Pass one to perform_simulation to record into it, all counters are sums over the recorded simulations
+    """
+    simulations: int = 0
+    phase_seconds: Dict[str, float] = field(default_factory=lambda: {phase: 0.0 for phase in SIMULATION_PHASES})
+    total_depth: int = 0  # depth of the leaves reached by selection
+    max_depth: int = 0
+    rollouts: int = 0
+    rollout_steps: int = 0  # only counted for rollouts following the default policy
+    max_rollout_length: int = 0
+    expansions: int = 0
+    nodes_created: int = 0  # also the summed branching factor at expansion
+    net_allocated_blocks: int = 0  # blocks held after the simulations minus before them, not the number of allocations
+    _lap_start: float = field(default=0.0, init=False, repr=False, compare=False)
+    _start_blocks: int = field(default=0, init=False, repr=False, compare=False)
+
+    @property
+    def mean_depth(self) -> float:
+        return self.total_depth / self.simulations if self.simulations != 0 else 0
+
+    @property
+    def mean_rollout_length(self) -> float:
+        return self.rollout_steps / self.rollouts if self.rollouts != 0 else 0
+
+    @property
+    def mean_branching_factor(self) -> float:
+        return self.nodes_created / self.expansions if self.expansions != 0 else 0
+
+    def start_simulation(self):
+        self.simulations += 1
+        self._start_blocks = sys.getallocatedblocks()
+        self._lap_start = time.perf_counter()
+
+    def lap(self, phase: str):
+        """Adds the time since the previous lap, or the start of the simulation, to the given phase"""
+        now = time.perf_counter()
+        self.phase_seconds[phase] += now - self._lap_start
+        self._lap_start = now
+
+    def end_simulation(self, depth: int):
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+        self.net_allocated_blocks += sys.getallocatedblocks() - self._start_blocks
+
+    def record_expansion(self, num_children: int):
+        self.expansions += 1
+        self.nodes_created += num_children
+
+    def record_rollout(self, length: int):
+        self.rollouts += 1
+        self.rollout_steps += length
+        self.max_rollout_length = max(self.max_rollout_length, length)
+
+    def merge(self, other: 'SimulationProfile'):
+        """Adds the counters of another profile to this one"""
+        self.simulations += other.simulations
+        for phase, seconds in other.phase_seconds.items():
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+        self.total_depth += other.total_depth
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.rollouts += other.rollouts
+        self.rollout_steps += other.rollout_steps
+        self.max_rollout_length = max(self.max_rollout_length, other.max_rollout_length)
+        self.expansions += other.expansions
+        self.nodes_created += other.nodes_created
+        self.net_allocated_blocks += other.net_allocated_blocks
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'simulations': self.simulations,
+            **{f"{phase}_seconds": seconds for phase, seconds in self.phase_seconds.items()},
+            'mean_depth': self.mean_depth,
+            'max_depth': self.max_depth,
+            'mean_rollout_length': self.mean_rollout_length,
+            'max_rollout_length': self.max_rollout_length,
+            'mean_branching_factor': self.mean_branching_factor,
+            'nodes_created': self.nodes_created,
+            'net_allocated_blocks': self.net_allocated_blocks
+        }
@@ -0,0 +1,111 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from mcts.mcts_core.mc_tree import TreeNode
+
+
+class SearchBudget(ABC):
+    """
+    Decides when the search of a move should stop.
+    Budgets are immutable, all progress of the search is given as arguments
+    """
+
+    @abstractmethod
+    def stop_reason(self, root_node: TreeNode, simulations: int, tree_nodes: int, elapsed: float) -> Optional[str]:
+        """
+        Returns: why the search should stop, None if it should continue
+        """
+        pass
+
+    def remaining_simulations(self, simulations: int, elapsed: float) -> Optional[float]:
+        """
+        Returns: an estimate of the simulations left before the budget is spent, None if unknown
+        """
+        return None
+
+
+@dataclass(frozen=True)
+class SimulationBudget(SearchBudget):
+    max_simulations: int
+
+    def stop_reason(self, root_node: TreeNode, simulations: int, tree_nodes: int, elapsed: float) -> Optional[str]:
+        return "simulations" if simulations >= self.max_simulations else None
+
+    def remaining_simulations(self, simulations: int, elapsed: float) -> Optional[float]:
+        return self.max_simulations - simulations
+
+
+@dataclass(frozen=True)
+class TimeBudget(SearchBudget):
+    seconds: float
+
+    def stop_reason(self, root_node: TreeNode, simulations: int, tree_nodes: int, elapsed: float) -> Optional[str]:
+        return "deadline" if elapsed >= self.seconds else None
+
+    def remaining_simulations(self, simulations: int, elapsed: float) -> Optional[float]:
+        if simulations == 0 or elapsed <= 0:
+            return None
+        # assumes the simulation rate so far holds until the deadline
+        return simulations / elapsed * (self.seconds - elapsed)
+
+
+@dataclass(frozen=True)
+class TreeSizeBudget(SearchBudget):
+    """Caps the number of nodes in the search tree, and with it the memory used"""
+    max_tree_nodes: int
+
+    def stop_reason(self, root_node: TreeNode, simulations: int, tree_nodes: int, elapsed: float) -> Optional[str]:
+        return "tree_nodes" if tree_nodes >= self.max_tree_nodes else None
+
+
+@dataclass(frozen=True)
+class CombinedBudget(SearchBudget):
+    """Stops as soon as any of the budgets is spent"""
+    budgets: Tuple[SearchBudget, ...]
+
+    def stop_reason(self, root_node: TreeNode, simulations: int, tree_nodes: int, elapsed: float) -> Optional[str]:
+        for budget in self.budgets:
+            reason = budget.stop_reason(root_node, simulations, tree_nodes, elapsed)
+            if reason is not None:
+                return reason
+        return None
+
+    def remaining_simulations(self, simulations: int, elapsed: float) -> Optional[float]:
+        remaining = [
+            budget.remaining_simulations(simulations, elapsed)
+            for budget in self.budgets
+        ]
+        known_remaining = [r for r in remaining if r is not None]
+        return min(known_remaining) if len(known_remaining) != 0 else None
+
+
+@dataclass(frozen=True)
+class EarlyStopBudget(SearchBudget):
+    """
+    Follows the given budget, but stops early once the most traversed root edge can not be overtaken
+    by the second most traversed one within the simulations remaining
+    """
+    budget: SearchBudget
+
+    def stop_reason(self, root_node: TreeNode, simulations: int, tree_nodes: int, elapsed: float) -> Optional[str]:
+        reason = self.budget.stop_reason(root_node, simulations, tree_nodes, elapsed)
+        if reason is not None:
+            return reason
+
+        remaining = self.budget.remaining_simulations(simulations, elapsed)
+        if remaining is None:
+            return None
+
+        edge_traversals = sorted((edge.traversals for edge in root_node.get_children_edges()), reverse=True)
+        if root_node.untried_actions is not None:
+            # actions lazy expansion did not try yet are edges without traversals
+            edge_traversals.extend(0 for action in root_node.untried_actions)
+        if len(edge_traversals) == 0:
+            return None
+        if len(edge_traversals) == 1:
+            return "decided"
+        return "decided" if edge_traversals[0] - edge_traversals[1] > remaining else None
+
+    def remaining_simulations(self, simulations: int, elapsed: float) -> Optional[float]:
+        return self.budget.remaining_simulations(simulations, elapsed)
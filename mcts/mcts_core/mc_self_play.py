@@ -0,0 +1,182 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from typing import List, Dict, Iterator, Tuple
+
+import numpy as np
+
+from mcts.mcts_core.game_simulator import GameSimulatorConfig, EpisodeResult, run_episode
+from mcts.mcts_core.state_manager import StateManager
+
+
+@dataclass(frozen=True)
+class SelfPlayConfig:
+    simulator_config: GameSimulatorConfig
+    output_dir: str
+    num_episodes: int = 1000
+    episodes_per_chunk: int = 100
+    workers: int = 1  # > 1 generates chunks in a process pool of that size
+    seed: int = 0  # episode i is seeded with seed + i, independently of chunking and workers
+
+
+@dataclass
+class TrainingExamples:
+    """
+    Training examples in columnar form, one row per move.
+    The visit counts of row i are visit_counts[visit_offsets[i]:visit_offsets[i + 1]],
+    in the order of get_successor_states of the state
+    """
+    states: np.ndarray  # encode_state of the state the move was made from, one row per move
+    players: np.ndarray  # the player making the move
+    visit_counts: np.ndarray
+    visit_offsets: np.ndarray
+    winners: np.ndarray  # the winner of the episode the move was made in
+    episodes: np.ndarray  # the episode index the move was made in
+
+    def __len__(self):
+        return self.players.shape[0]
+
+    def visit_distribution(self, index: int) -> np.ndarray:
+        visits = self.visit_counts[self.visit_offsets[index]:self.visit_offsets[index + 1]]
+        total = visits.sum()
+        if total == 0:
+            # a move decided before any simulation, like the only legal move under early stopping, has no preference
+            return np.full(len(visits), 1 / len(visits)) if len(visits) != 0 else np.zeros(0)
+        return visits / total
+
+
+def episode_training_examples(state_manager: StateManager, episode: int, result: EpisodeResult) -> TrainingExamples:
+    num_moves = len(result.move_stats)
+    winner = state_manager.player_won(result.state_history[-1])
+    visit_offsets = np.zeros(num_moves + 1, dtype=np.int64)
+    np.cumsum([len(stats.root_child_traversals) for stats in result.move_stats], out=visit_offsets[1:])
+    if num_moves != 0:
+        # the last state has no move, it is terminal
+        states = np.stack([state_manager.encode_state(state) for state in result.state_history[:num_moves]])
+    else:
+        # the initial state is terminal, the shape of a row is taken from its encoding
+        encoded_state = state_manager.encode_state(result.state_history[0])
+        states = np.empty((0,) + encoded_state.shape, dtype=encoded_state.dtype)
+
+    return TrainingExamples(
+        states=states,
+        players=np.array([stats.player for stats in result.move_stats], dtype=np.int8),
+        visit_counts=np.fromiter(
+            (traversals for stats in result.move_stats for traversals in stats.root_child_traversals),
+            dtype=np.int64, count=visit_offsets[-1]),
+        visit_offsets=visit_offsets,
+        winners=np.full(num_moves, winner, dtype=np.int8),
+        episodes=np.full(num_moves, episode, dtype=np.int64)
+    )
+
+
+def concatenate_training_examples(examples: List[TrainingExamples]) -> TrainingExamples:
+    visit_offsets = [examples[0].visit_offsets[:1]]
+    total_visit_counts = 0
+    for example in examples:
+        visit_offsets.append(example.visit_offsets[1:] + total_visit_counts)
+        total_visit_counts += example.visit_offsets[-1]
+
+    return TrainingExamples(
+        states=np.concatenate([example.states for example in examples]),
+        players=np.concatenate([example.players for example in examples]),
+        visit_counts=np.concatenate([example.visit_counts for example in examples]),
+        visit_offsets=np.concatenate(visit_offsets),
+        winners=np.concatenate([example.winners for example in examples]),
+        episodes=np.concatenate([example.episodes for example in examples])
+    )
+
+
+def chunk_path(output_dir: str, chunk: int) -> str:
+    return os.path.join(output_dir, f"chunk_{chunk:05d}.npz")
+
+
+def save_training_examples(examples: TrainingExamples, path: str):
+    """Writes to a temporary file first, so a chunk file only exists once it is complete"""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as f:
+        np.savez_compressed(f, **examples.__dict__)
+    os.replace(temporary_path, path)
+
+
+def load_training_examples(path: str) -> TrainingExamples:
+    with np.load(path) as data:
+        return TrainingExamples(**{name: data[name] for name in data.files})
+
+
+def generate_chunk(config: SelfPlayConfig, chunk: int) -> str:
+    state_manager = config.simulator_config.game_state_manager
+    first_episode = chunk * config.episodes_per_chunk
+    last_episode = min(first_episode + config.episodes_per_chunk, config.num_episodes)
+
+    examples = []
+    for episode in range(first_episode, last_episode):
+        random.seed(config.seed + episode)
+        result = run_episode(config.simulator_config)
+        examples.append(episode_training_examples(state_manager, episode, result))
+
+    path = chunk_path(config.output_dir, chunk)
+    save_training_examples(concatenate_training_examples(examples), path)
+    return path
+
+
+def run_self_play(config: SelfPlayConfig) -> List[str]:
+    """
+    Generates the training data of config.num_episodes self-play episodes into chunk files in config.output_dir.
+    Chunks that already exist are skipped, so an interrupted run is resumed by running it again
+    Returns: the paths of all chunks
+    """
+    if config.simulator_config.root_parallel_workers > 1:
+        # the chunks are the unit of parallelism, use config.workers instead
+        raise ValueError("self-play searches with a single process, root_parallel_workers must be 1")
+    os.makedirs(config.output_dir, exist_ok=True)
+    config = replace(config, simulator_config=replace(config.simulator_config, verbose=False))
+
+    num_chunks = (config.num_episodes + config.episodes_per_chunk - 1) // config.episodes_per_chunk
+    paths = [chunk_path(config.output_dir, chunk) for chunk in range(num_chunks)]
+    missing_chunks = [chunk for chunk in range(num_chunks) if not os.path.exists(paths[chunk])]
+    print(f"Generating {len(missing_chunks)} of {num_chunks} chunks")
+
+    if config.workers <= 1:
+        for chunk in missing_chunks:
+            print(f"Finished chunk {chunk}: {generate_chunk(config, chunk)}")
+        return paths
+
+    with ProcessPoolExecutor(max_workers=config.workers) as executor:
+        future_to_chunk = {executor.submit(generate_chunk, config, chunk): chunk for chunk in missing_chunks}
+        for future in as_completed(future_to_chunk):
+            print(f"Finished chunk {future_to_chunk[future]}: {future.result()}")
+    return paths
+
+
+def iter_training_examples(paths: List[str]) -> Iterator[Tuple[np.ndarray, int, np.ndarray, int]]:
+    """Yields: (encoded state, player, visit distribution, winner) of every move in the given chunks"""
+    for path in paths:
+        examples = load_training_examples(path)
+        for i in range(len(examples)):
+            yield examples.states[i], int(examples.players[i]), examples.visit_distribution(i), int(examples.winners[i])
+
+
+def training_data_summary(paths: List[str]) -> Dict[str, int]:
+    examples = [load_training_examples(path) for path in paths]
+    return {
+        'chunks': len(paths),
+        'episodes': sum(len(np.unique(example.episodes)) for example in examples),
+        'moves': sum(len(example) for example in examples)
+    }
+
+
+if __name__ == '__main__':
+    import tempfile
+    from mcts.test_games.nim_state_manager import NimStateManager
+
+    output_dir = tempfile.mkdtemp()
+    self_play_paths = run_self_play(SelfPlayConfig(
+        simulator_config=GameSimulatorConfig(NimStateManager(20, 3, 0), verbose=False),
+        output_dir=output_dir,
+        num_episodes=20,
+        episodes_per_chunk=5,
+        workers=2
+    ))
+    print(training_data_summary(self_play_paths))
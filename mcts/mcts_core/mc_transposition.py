@@ -0,0 +1,69 @@
+from typing import OrderedDict, Tuple, Type, Union
+
+from mcts.mcts_core.mc_tree import TreeNode, CompactTreeNode
+from mcts.mcts_core.state_manager import GameState
+
+
+class TranspositionTable:
+    """
+    Maps (game state, next player) to the tree node searching it, so identical positions reached
+    by different move orders share one node and the tree becomes a DAG.
+    Bounded to max_size entries, the least recently used entry is evicted first.
+    An evicted node stays in the tree, it is just no longer shared with new parents.
+    """
+
+    def __init__(self, max_size: int = 100000, node_type: Type[Union[TreeNode, CompactTreeNode]] = TreeNode):
+        if max_size <= 0:
+            raise ValueError("transposition table size must be positive")
+        self.max_size = max_size
+        self.node_type = node_type  # the class of the created nodes
+        self._nodes: OrderedDict[Tuple[GameState, int], TreeNode] = OrderedDict[Tuple[GameState, int], TreeNode]()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups != 0 else 0
+
+    def get_or_create(self, state: GameState, next_player: int) -> TreeNode:
+        key = (state, next_player)
+        node = self._nodes.get(key)
+        if node is not None:
+            self.hits += 1
+            self._nodes.move_to_end(key)
+            return node
+
+        self.misses += 1
+        node = self.node_type(state, next_player=next_player)
+        self._nodes[key] = node
+        if len(self._nodes) > self.max_size:
+            self._nodes.popitem(last=False)
+            self.evictions += 1
+        return node
+
+    def clear(self):
+        """Removes all entries, the counters are kept"""
+        self._nodes.clear()
+
+    def retain_subtree(self, root_node: TreeNode):
+        """
+        Removes the entries of nodes not reachable from root_node, so the rest of the old tree can be garbage collected.
+        A shared node's parent is the last node expanded to it, which may not be reachable anymore,
+        hence every kept node is given a parent reachable from root_node
+        """
+        reachable = {id(root_node)}
+        queue = [root_node]
+        for node in queue:
+            for child in node.iter_children():
+                if id(child) not in reachable:
+                    reachable.add(id(child))
+                    child.parent = node
+                    queue.append(child)
+        self._nodes = OrderedDict[Tuple[GameState, int], TreeNode](
+            (key, node) for key, node in self._nodes.items() if id(node) in reachable
+        )
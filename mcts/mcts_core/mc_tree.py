@@ -1,5 +1,8 @@
+from array import array
 from dataclasses import dataclass
-from typing import Optional, OrderedDict, List
+from typing import Optional, OrderedDict, List, Tuple, Iterator
+
+import numpy as np
 
 from mcts.mcts_core.state_manager import GameState
 from mcts.mcts_core.utils import two_player_other_player
@@ -20,39 +23,292 @@ class TreeNode:
         self.game_state = state  # read only
         self.visits = 0
         self.next_player = next_player  # automatically calculated if added as a child
+        self.proven_winner: Optional[int] = None  # set by the solver, the player winning from this node with perfect play
+        self.untried_actions: Optional[List[int]] = None  # set by lazy expansion, actions without a child yet
+        self.action_index: Optional[int] = None  # set by lazy expansion, the index of the node among its parents successors
 
         self.parent: Optional['TreeNode'] = None  # read only
         self.children_edges: OrderedDict['TreeNode', TreeNodeChildEdge] = OrderedDict[TreeNode, TreeNodeChildEdge]()
+        self._edge_list: Optional[List[TreeNodeChildEdge]] = None  # the edges in child order, built by add_to_edge
+        self._children_list: Optional[List['TreeNode']] = None  # the children in order, built by get_child
         if child is not None:
             self.add_child(child)
 
     def add_child(self, node: 'TreeNode'):
-        self.children_edges[node] = TreeNodeChildEdge(
+        edge = TreeNodeChildEdge(
             q_value=0,
             traversals=0,
             eval=0
         )
+        self.children_edges[node] = edge
+        if self._edge_list is not None:
+            self._edge_list.append(edge)
+        if self._children_list is not None:
+            self._children_list.append(node)
         node.next_player = two_player_other_player(self.next_player)
         node.parent = self
 
+    def add_child_from_state(self, state: GameState) -> 'TreeNode':
+        child = TreeNode(state)
+        self.add_child(child)
+        return child
+
+    def num_children(self) -> int:
+        return len(self.children_edges)
+
+    def iter_children(self) -> Iterator['TreeNode']:
+        return iter(self.children_edges)
+
+    def iter_children_edge_stats(self) -> Iterator[Tuple['TreeNode', float, int]]:
+        """Yields the child, q_value and traversals of every child edge, without building lists"""
+        return ((child, edge.q_value, edge.traversals) for child, edge in self.children_edges.items())
+
     def get_children(self):
         return list(self.children_edges.keys())
 
     def get_children_edges(self):
         return list(self.children_edges.values())
 
+    def get_child(self, index: int) -> 'TreeNode':
+        if self._children_list is None:
+            self._children_list = list(self.children_edges)
+        return self._children_list[index]
+
+    def get_children_edge_stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the q_values and traversals of the child edges as arrays, read in one pass over the edges"""
+        q_values = []
+        traversals = []
+        for edge in self.children_edges.values():
+            q_values.append(edge.q_value)
+            traversals.append(edge.traversals)
+        return np.array(q_values, dtype=np.float64), np.array(traversals, dtype=np.float64)
+
+    def add_to_edge(self, index: int, traversals: int, eval: float):
+        """
+        Adds traversals and their summed eval to the edge to the child at the index, and updates its q_value.
+        The edge is reached by position, without hashing the child
+        """
+        if self._edge_list is None:
+            self._edge_list = list(self.children_edges.values())
+        edge = self._edge_list[index]
+        edge.traversals += traversals
+        edge.eval += eval
+        edge.q_value = edge.eval / edge.traversals if edge.traversals != 0 else 0
+
     def get_edge_to_child(self, child: 'TreeNode'):
         if not child in self.children_edges:
             raise ValueError("trying to retrieve child edge of a non-existing child")
         return self.children_edges[child]
 
+    def add_to_child_edge(self, child: 'TreeNode', traversals: int, eval: float):
+        """Like add_to_edge, for the edge to the given child"""
+        edge = self.children_edges.get(child)
+        if edge is None:
+            raise ValueError("trying to retrieve child edge of a non-existing child")
+        edge.traversals += traversals
+        edge.eval += eval
+        edge.q_value = edge.eval / edge.traversals if edge.traversals != 0 else 0
+
     def add_children(self, nodes: List['TreeNode']):
         for node in nodes:
             self.add_child(node)
 
+    def add_children_from_states(self, states: List[GameState]):
+        self.add_children([
+            TreeNode(state)
+            for state in states
+        ])
+
     def copy_and_remove_tree(self):
         return TreeNode(self.game_state, next_player=self.next_player)
 
+    def promote_to_root(self) -> 'TreeNode':
+        """
+        Makes the node the root of its subtree, keeping all its statistics.
+        The parent keeps only its edge to this node, so the sibling subtrees can be garbage collected
+        """
+        parent = self.parent
+        if parent is not None:
+            edge = parent.get_edge_to_child(self)
+            parent.children_edges = OrderedDict[TreeNode, TreeNodeChildEdge]([(self, edge)])
+            parent._edge_list = None
+            parent._children_list = None
+            self.parent = None
+        return self
+
+    def __str__(self):
+        return f"(visits={self.visits} next_player={self.next_player} state={self.game_state})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+_NO_CHILDREN = ()  # shared by all leaves of compact trees, replaced by a list and an array when the first child is added
+_EDGE_STATS = 3  # q_value, traversals and eval of every child edge, see CompactTreeNode.edge_stats
+
+
+class CompactTreeNodeChildEdge:
+    """A view of the stats of a child edge, stored in the edge_stats array of a CompactTreeNode"""
+    __slots__ = ('_node', '_offset')
+
+    def __init__(self, node: 'CompactTreeNode', index: int):
+        self._node = node
+        self._offset = _EDGE_STATS * index
+
+    @property
+    def q_value(self) -> float:
+        return self._node.edge_stats[self._offset]
+
+    @q_value.setter
+    def q_value(self, q_value: float):
+        self._node.edge_stats[self._offset] = q_value
+
+    @property
+    def traversals(self) -> int:
+        return int(self._node.edge_stats[self._offset + 1])
+
+    @traversals.setter
+    def traversals(self, traversals: int):
+        self._node.edge_stats[self._offset + 1] = traversals
+
+    @property
+    def eval(self) -> float:
+        return self._node.edge_stats[self._offset + 2]
+
+    @eval.setter
+    def eval(self, eval: float):
+        self._node.edge_stats[self._offset + 2] = eval
+
+    def __str__(self):
+        return f"[e={self.eval} t={self.traversals} q={'%.3f' % self.q_value}]"
+
+
+class CompactTreeNode:
+    """
+    The interface of TreeNode without a per instance __dict__. Children are kept in a list and the stats
+    of the edges to them in one flat float array, instead of an OrderedDict of edge objects.
+    Edges are views created on access, iter_children_edge_stats reads the array without creating them
+    """
+    __slots__ = ('game_state', 'visits', 'next_player', 'proven_winner', 'untried_actions', 'action_index', 'parent',
+                 'index_in_parent', 'children', 'edge_stats')
+
+    def __init__(self, state: GameState, next_player: Optional[int] = None, child: Optional['CompactTreeNode'] = None):
+        self.game_state = state  # read only
+        self.visits = 0
+        self.next_player = next_player  # automatically calculated if added as a child
+        self.proven_winner: Optional[int] = None
+        self.untried_actions: Optional[List[int]] = None
+        self.action_index: Optional[int] = None
+
+        self.parent: Optional['CompactTreeNode'] = None  # read only
+        self.index_in_parent = 0  # read only, the position of the node among the children of its parent
+        self.children: List['CompactTreeNode'] = _NO_CHILDREN  # read only
+        # read only, the q_value, traversals and eval of the edge to children[i] start at index 3 * i
+        self.edge_stats: array = _NO_CHILDREN
+        if child is not None:
+            self.add_child(child)
+
+    def add_child(self, node: 'CompactTreeNode'):
+        if self.children is _NO_CHILDREN:
+            self.children = []
+            self.edge_stats = array('d')
+        node.index_in_parent = len(self.children)
+        self.children.append(node)
+        self.edge_stats.extend((0, 0, 0))
+        node.next_player = two_player_other_player(self.next_player)
+        node.parent = self
+
+    def add_child_from_state(self, state: GameState) -> 'CompactTreeNode':
+        child = CompactTreeNode(state)
+        self.add_child(child)
+        return child
+
+    def num_children(self) -> int:
+        return len(self.children)
+
+    def iter_children(self) -> Iterator['CompactTreeNode']:
+        return iter(self.children)
+
+    def iter_children_edge_stats(self) -> Iterator[Tuple['CompactTreeNode', float, float]]:
+        """
+        Yields the child, q_value and traversals of every child edge, traversals as a float.
+        The stats are read through strided views of edge_stats instead of copies, no child can be added
+        to the node while the iterator is in use
+        """
+        if self.children is _NO_CHILDREN:
+            return iter(_NO_CHILDREN)
+        edge_stats = memoryview(self.edge_stats)
+        return zip(self.children, edge_stats[0::_EDGE_STATS], edge_stats[1::_EDGE_STATS])
+
+    def get_children(self):
+        return list(self.children)
+
+    def get_children_edges(self):
+        return [CompactTreeNodeChildEdge(self, i) for i in range(len(self.children))]
+
+    def get_child(self, index: int) -> 'CompactTreeNode':
+        return self.children[index]
+
+    def get_children_edge_stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the q_values and traversals of the child edges as arrays"""
+        edge_stats = np.array(self.edge_stats, dtype=np.float64).reshape(-1, _EDGE_STATS)
+        return edge_stats[:, 0], edge_stats[:, 1]
+
+    def add_to_edge(self, index: int, traversals: int, eval: float):
+        """Adds traversals and their summed eval to the edge to the child at the index, and updates its q_value"""
+        edge_stats = self.edge_stats
+        offset = _EDGE_STATS * index
+        edge_traversals = edge_stats[offset + 1] + traversals
+        edge_eval = edge_stats[offset + 2] + eval
+        edge_stats[offset] = edge_eval / edge_traversals if edge_traversals != 0 else 0
+        edge_stats[offset + 1] = edge_traversals
+        edge_stats[offset + 2] = edge_eval
+
+    def _child_position(self, child: 'CompactTreeNode') -> int:
+        index = child.index_in_parent
+        children = self.children
+        if index >= len(children) or children[index] is not child:
+            # a node shared by a transposition table is only at index_in_parent of the parent that added it last
+            try:
+                index = children.index(child)
+            except ValueError:
+                raise ValueError("trying to retrieve child edge of a non-existing child") from None
+        return index
+
+    def get_edge_to_child(self, child: 'CompactTreeNode') -> CompactTreeNodeChildEdge:
+        return CompactTreeNodeChildEdge(self, self._child_position(child))
+
+    def add_to_child_edge(self, child: 'CompactTreeNode', traversals: int, eval: float):
+        """Like add_to_edge, for the edge to the given child, without creating an edge view"""
+        self.add_to_edge(self._child_position(child), traversals, eval)
+
+    def add_children(self, nodes: List['CompactTreeNode']):
+        for node in nodes:
+            self.add_child(node)
+
+    def add_children_from_states(self, states: List[GameState]):
+        self.add_children([
+            CompactTreeNode(state)
+            for state in states
+        ])
+
+    def copy_and_remove_tree(self):
+        return CompactTreeNode(self.game_state, next_player=self.next_player)
+
+    def promote_to_root(self) -> 'CompactTreeNode':
+        """
+        Makes the node the root of its subtree, keeping all its statistics.
+        The parent keeps only its edge to this node, so the sibling subtrees can be garbage collected
+        """
+        parent = self.parent
+        if parent is not None:
+            offset = parent.get_edge_to_child(self)._offset
+            parent.children = [self]
+            parent.edge_stats = parent.edge_stats[offset:offset + _EDGE_STATS]
+            self.parent = None
+            self.index_in_parent = 0
+        return self
+
     def __str__(self):
         return f"(visits={self.visits} next_player={self.next_player} state={self.game_state})"
 
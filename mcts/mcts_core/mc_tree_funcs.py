@@ -1,10 +1,23 @@
+import gc
+import io
+import math
 import random
+import sys
 from abc import ABC, abstractmethod
-from typing import Optional, Union, List
+from dataclasses import dataclass
+from typing import Optional, Union, List, Iterable, TextIO, Tuple, Sequence
 
+import numpy as np
+
+from mcts.mcts_core.mc_array_tree import ArrayTreeNode
+from mcts.mcts_core.mc_profiling import SimulationProfile
+from mcts.mcts_core.mc_transposition import TranspositionTable
 from mcts.mcts_core.mc_tree import TreeNode, TreeNodeChildEdge
 from mcts.mcts_core.state_manager import StateManager, GameState
-from mcts.mcts_core.utils import max_with_probabilities, repeat_str, fixed_size_str_center
+from mcts.mcts_core.utils import max_with_probabilities, fixed_size_str_center, two_player_other_player
+
+
+EdgePath = List[Tuple[TreeNode, int]]  # (node, index of the child edge followed from it) of every step, from the root
 
 
 class TreePolicy(ABC):
@@ -12,6 +25,14 @@ class TreePolicy(ABC):
     def follow_policy(self, node: TreeNode) -> TreeNode:
         pass
 
+    def follow_policy_edge(self, node: TreeNode) -> Tuple[int, TreeNode]:
+        """Returns: the index of the child chosen by follow_policy and the child, override to skip finding the index"""
+        child = self.follow_policy(node)
+        for index, other in enumerate(node.iter_children()):
+            if other == child:
+                return index, child
+        raise ValueError("the tree policy chose a node that is not a child")
+
 
 class DefaultPolicy(ABC):
     @abstractmethod
@@ -19,18 +40,32 @@ class DefaultPolicy(ABC):
         pass
 
 
+class LeafEvaluator(ABC):
+    """Estimates the value of leaf states in [-1, 1], where 1 is a win for the first player"""
+
+    @abstractmethod
+    def evaluate(self, state: GameState) -> float:
+        pass
+
+    def evaluate_batch(self, states: List[GameState]) -> np.ndarray:
+        """Override when many states can be evaluated faster at once"""
+        return np.array([self.evaluate(state) for state in states], dtype=np.float64)
+
+
 def backprop_node_value(from_child_node: TreeNode, value: float, root_node: Optional[TreeNode] = None):
     """Mutates the tree"""
+    if isinstance(from_child_node, ArrayTreeNode):
+        root_index = root_node.index if root_node is not None else 0
+        from_child_node.tree.backprop(from_child_node.index, value, root_index=root_index)
+        return
+
     node = from_child_node
     prev_node: Optional[TreeNode] = None  # needed to retrieve the right edge
     while True:
         node.visits += 1
         if prev_node is not None:
             # update edge to child
-            edge = node.get_edge_to_child(prev_node)
-            edge.traversals += 1
-            edge.eval += value
-            edge.q_value = edge.eval / edge.traversals
+            node.add_to_child_edge(prev_node, 1, value)
 
         if node.parent is None or (root_node is not None and node == root_node):
             break
@@ -39,7 +74,48 @@ def backprop_node_value(from_child_node: TreeNode, value: float, root_node: Opti
             node = node.parent
 
 
+def backprop_edge_path(edges: EdgePath, leaf: TreeNode, values: Union[float, Sequence[float]]):
+    """
+    Adds the values to the path recorded by tree_search_edges, ending at the leaf, in one pass from the root.
+    Every edge is reached by its index, without parent pointers or lookups, hence it also works on DAGs.
+    values is a single value or a batch, like the values of several rollouts of the leaf, each counting as one traversal
+    """
+    if isinstance(values, (int, float)):
+        traversals, eval = 1, values
+    else:
+        traversals, eval = len(values), float(sum(values))
+    leaf.visits += traversals
+    for node, index in edges:
+        node.visits += traversals
+        node.add_to_edge(index, traversals, eval)
+
+
+def _add_to_path_edges(edges: EdgePath, leaf: TreeNode, traversals: int, eval_per_traversal: float):
+    leaf.visits += traversals
+    for node, index in edges:
+        node.visits += traversals
+        # the loss is counted against the player choosing the edge
+        node.add_to_edge(index, traversals,
+                         traversals * (eval_per_traversal if node.next_player == 1 else -eval_per_traversal))
+
+
+def apply_virtual_loss(edges: EdgePath, leaf: TreeNode, virtual_loss: int = 1):
+    """
+    Counts virtual_loss lost traversals on every edge of the path recorded by tree_search_edges, from the root,
+    so further descents started before the path is evaluated prefer other paths
+    """
+    _add_to_path_edges(edges, leaf, virtual_loss, 1)
+
+
+def revert_virtual_loss(edges: EdgePath, leaf: TreeNode, virtual_loss: int = 1):
+    _add_to_path_edges(edges, leaf, -virtual_loss, 1)
+
+
 def follow_most_traversed_child_edge(node: TreeNode) -> TreeNode:
+    """
+    The most traversed child. When the solver proved children, proven wins are always preferred,
+    and proven losses are only chosen if every move loses
+    """
     if node.next_player is None or not (0 <= node.next_player <= 1):
         raise ValueError("nodes next player is not assigned")
 
@@ -48,21 +124,152 @@ def follow_most_traversed_child_edge(node: TreeNode) -> TreeNode:
         edge.traversals
         for edge in node.get_children_edges()
     ]
+    winning = [i for i, child in enumerate(children) if child.proven_winner == node.next_player]
+    candidates = winning if len(winning) != 0 else [i for i, child in enumerate(children) if child.proven_winner is None]
+    if 0 < len(candidates) < len(children):
+        children = [children[i] for i in candidates]
+        probabilities = [probabilities[i] for i in candidates]
     node = max_with_probabilities(children, probabilities)
     return node
 
 
+def prove_terminal_children(state_manager: StateManager, node: TreeNode):
+    """Marks the terminal children of a freshly expanded node as proven"""
+    for child in node.get_children():
+        if state_manager.is_terminal_state(child.game_state):
+            child.proven_winner = state_manager.player_won(child.game_state)
+
+
+def update_proven_winner(node: TreeNode) -> bool:
+    """
+    The MCTS-Solver rule: a node is won by the player to move if one child is won by that player,
+    and lost if every child is won by the other player
+    Returns: true if the node is proven
+    """
+    if node.proven_winner is not None:
+        return True
+
+    children = node.get_children()
+    if len(children) == 0:
+        return False
+    children_winners = [child.proven_winner for child in children]
+    if node.next_player in children_winners:
+        node.proven_winner = node.next_player
+    elif None not in children_winners:
+        node.proven_winner = two_player_other_player(node.next_player)
+    else:
+        return False
+    return True
+
+
+def propagate_proven_winners(nodes: Iterable[TreeNode]):
+    """Applies update_proven_winner to the nodes, from the bottom of a path up, until a node cannot be proven"""
+    for node in nodes:
+        if not update_proven_winner(node):
+            break
+
+
 def tree_search(root_node: TreeNode, tree_policy: TreePolicy) -> TreeNode:
     node = root_node
-    while len(node.get_children()) > 0:
+    while node.num_children() > 0:
         node = tree_policy.follow_policy(node)
 
     return node
 
 
-def expand_node(state_manager: StateManager, node: TreeNode) -> bool:
+def count_tree_nodes(root_node: TreeNode, shared_nodes: bool = False) -> int:
+    """
+    Counts the nodes reachable from the root node, nodes shared by several parents are counted once per parent,
+    unless shared_nodes is set, as in the DAGs built with a transposition table
+    """
+    if shared_nodes:
+        seen = {id(root_node)}
+        queue = [root_node]
+        for node in queue:
+            for child in node.iter_children():
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    queue.append(child)
+        return len(seen)
+
+    num_nodes = 0
+    stack = [root_node]
+    while len(stack) > 0:
+        node = stack.pop()
+        num_nodes += 1
+        stack.extend(node.iter_children())
+    return num_nodes
+
+
+@dataclass
+class TreeMemoryStats:
+    nodes: int
+    node_bytes: int  # held by the nodes and their child edges
+    state_bytes: int  # held by the game states of the nodes
+
+    @property
+    def bytes_per_node(self) -> float:
+        return self.node_bytes / self.nodes if self.nodes != 0 else 0
+
+
+def _deep_size(objects: Iterable, seen: set) -> int:
+    """The bytes of the objects and everything they reference, skipping objects in seen and adding the rest to it"""
+    size = 0
+    stack = list(objects)
+    while len(stack) > 0:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def tree_memory_stats(root_node: TreeNode) -> TreeMemoryStats:
+    """
+    Measures the memory of the tree of the root node, following the references of every node except those to
+    other nodes and to game states, which are measured separately. Objects shared by several nodes are counted once
+    """
+    if isinstance(root_node, ArrayTreeNode):
+        tree = root_node.tree
+        arrays_bytes = sum(value.nbytes for value in vars(tree).values() if isinstance(value, np.ndarray))
+        seen = set()
+        state_bytes = _deep_size(tree.game_states, seen)
+        return TreeMemoryStats(nodes=len(tree), node_bytes=arrays_bytes + sys.getsizeof(tree.game_states),
+                               state_bytes=state_bytes)
+
+    nodes = []
+    seen = set()
+    stack = [root_node]
+    while len(stack) > 0:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            nodes.append(node)
+            stack.extend(node.iter_children())
+
+    state_bytes = _deep_size((node.game_state for node in nodes), seen)
+    node_bytes = sum(sys.getsizeof(node) + _deep_size(gc.get_referents(node), seen) for node in nodes)
+    return TreeMemoryStats(nodes=len(nodes), node_bytes=node_bytes, state_bytes=state_bytes)
+
+
+def tree_search_edges(root_node: TreeNode, tree_policy: TreePolicy) -> Tuple[EdgePath, TreeNode]:
+    """Like tree_search, but also records the edge taken at every step, for backprop_edge_path"""
+    node = root_node
+    edges = []
+    while node.num_children() > 0:
+        index, child = tree_policy.follow_policy_edge(node)
+        edges.append((node, index))
+        node = child
+
+    return edges, node
+
+
+def expand_node(state_manager: StateManager, node: TreeNode, transpositions: Optional[TranspositionTable] = None) -> bool:
     """
     Finds all child nodes and adds them to the given node, if the node is not a final state
+    If a transposition table is given, children already in the tree are shared instead of created
     Returns: true if children were added else false
     """
     if len(node.get_children()) != 0:
@@ -71,18 +278,85 @@ def expand_node(state_manager: StateManager, node: TreeNode) -> bool:
         return False
     else:
         next_states = state_manager.get_successor_states(node.game_state)
-        children = [
-            TreeNode(state)
-            for state in next_states
-        ]
-        node.add_children(children)
+        if transpositions is not None:
+            children_next_player = two_player_other_player(node.next_player)
+            node.add_children([
+                transpositions.get_or_create(state, children_next_player)
+                for state in next_states
+            ])
+        else:
+            node.add_children_from_states(next_states)
+        return True
+
+
+def _can_widen(node: TreeNode, widening_constant: float, widening_exponent: float) -> bool:
+    if widening_constant <= 0:
         return True
+    return node.num_children() < max(1, math.ceil(widening_constant * node.visits ** widening_exponent))
+
+
+def lazy_tree_search(
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy,
+        widening_constant: float = 0,
+        widening_exponent: float = 0.5
+) -> TreeNode:
+    """
+    Descends like tree_search, but creates children one at a time, from a random untried action of the first node
+    reached that has one. With a widening_constant > 0 (progressive widening) a node only gets another child
+    while it has less than widening_constant * visits ** widening_exponent children, otherwise the descent continues
+    Returns: the created child, or a terminal node
+    """
+    return lazy_tree_search_edges(state_manager, root_node, tree_policy, widening_constant, widening_exponent)[1]
 
 
-def rollout(state_manager: StateManager, start_state: GameState, default_policy: DefaultPolicy) -> int:
+def lazy_tree_search_edges(
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy,
+        widening_constant: float = 0,
+        widening_exponent: float = 0.5
+) -> Tuple[EdgePath, TreeNode]:
+    """Like lazy_tree_search, but also records the edge taken at every step, for backprop_edge_path"""
+    node = root_node
+    edges = []
+    while True:
+        if node.untried_actions is None:
+            if state_manager.is_terminal_state(node.game_state):
+                return edges, node
+            node.untried_actions = list(range(state_manager.get_legal_action_count(node.game_state)))
+            random.shuffle(node.untried_actions)
+
+        if len(node.untried_actions) != 0 and _can_widen(node, widening_constant, widening_exponent):
+            action_index = node.untried_actions.pop()
+            child = node.add_child_from_state(state_manager.apply_action(node.game_state, action_index))
+            child.action_index = action_index
+            edges.append((node, node.num_children() - 1))
+            return edges, child
+
+        index, child = tree_policy.follow_policy_edge(node)
+        edges.append((node, index))
+        node = child
+
+
+def rollout(
+        state_manager: StateManager,
+        start_state: GameState,
+        default_policy: DefaultPolicy,
+        profile: Optional[SimulationProfile] = None
+) -> int:
     state = start_state
+    if profile is None:
+        while not state_manager.is_terminal_state(state):
+            state = default_policy.follow_policy(state)
+        return state_manager.player_won(state)
+
+    length = 0
     while not state_manager.is_terminal_state(state):
         state = default_policy.follow_policy(state)
+        length += 1
+    profile.record_rollout(length)
     return state_manager.player_won(state)
 
 
@@ -98,35 +372,79 @@ class Bcolors:
     YELLOW = "\033[33m"
 
 
-def tree_str(
+def write_tree(
         node: TreeNode,
+        out: TextIO,
+        highlight_nodes: Union[None, TreeNode, Iterable[TreeNode]] = None,
+        print_only_highlighted: bool = False,
+        max_depth: Optional[int] = None,
+        min_visits: int = 0,
         edge: Optional[TreeNodeChildEdge] = None,
-        level=0,
-        highlight_nodes: Union[None, TreeNode, List[TreeNode]] = None,
-        print_only_highlighted: bool = False
+        level: int = 0
 ):
+    """
+    Streams the tree to the file-like out, one node per line, depth first without recursion
+    Subtrees deeper than max_depth, or whose node has less than min_visits visits, are left out
+    """
     indent_len = 25
-    edge_str = edge.__str__() if edge is not None else ""
-    highlight_this_node = highlight_nodes is not None and (
-        (isinstance(highlight_nodes, TreeNode) and highlight_nodes == node)
-        or (isinstance(highlight_nodes, list) and node in highlight_nodes)
-    )
-    s = ""
-    if print_only_highlighted and not highlight_this_node:
-        return s
-
-    s += "\n" + repeat_str((level-1), repeat_str(indent_len, " ")) \
-        + ("|" + fixed_size_str_center(indent_len-2, edge_str, "_") + " " if level != 0 else "") \
-        + (node.__str__() if not highlight_this_node else f"{Bcolors.YELLOW}{node.__str__()}{Bcolors.ENDC}")
+    indent = " " * indent_len
+    if highlight_nodes is None:
+        highlight_set = set()
+    elif isinstance(highlight_nodes, (list, tuple, set, frozenset)):
+        highlight_set = set(highlight_nodes)
+    else:
+        highlight_set = {highlight_nodes}
+
+    stack = [(node, edge, level)]
+    while len(stack) > 0:
+        node, edge, level = stack.pop()
+        highlight_this_node = node in highlight_set
+        if print_only_highlighted and not highlight_this_node:
+            continue
+        if level != 0 and node.visits < min_visits:
+            continue
+
+        out.write("\n")
+        if level != 0:
+            edge_str = edge.__str__() if edge is not None else ""
+            out.write(indent * (level - 1))
+            out.write("|" + fixed_size_str_center(indent_len - 2, edge_str, "_") + " ")
+        out.write(node.__str__() if not highlight_this_node else f"{Bcolors.YELLOW}{node.__str__()}{Bcolors.ENDC}")
+
+        if max_depth is None or level < max_depth:
+            children = list(zip(node.get_children(), node.get_children_edges()))
+            # reversed, so that the first child is written first
+            stack.extend((child, child_edge, level + 1) for child, child_edge in reversed(children))
 
-    for child, edge in zip(node.get_children(), node.get_children_edges()):
-        s += tree_str(child, edge=edge, level=level+1, highlight_nodes=highlight_nodes, print_only_highlighted=print_only_highlighted)
 
-    return s
+def tree_str(
+        node: TreeNode,
+        edge: Optional[TreeNodeChildEdge] = None,
+        level=0,
+        highlight_nodes: Union[None, TreeNode, Iterable[TreeNode]] = None,
+        print_only_highlighted: bool = False,
+        max_depth: Optional[int] = None,
+        min_visits: int = 0
+):
+    out = io.StringIO()
+    write_tree(node, out, highlight_nodes=highlight_nodes, print_only_highlighted=print_only_highlighted,
+               max_depth=max_depth, min_visits=min_visits, edge=edge, level=level)
+    return out.getvalue()
 
 
-def print_tree(node: TreeNode, highlight_nodes: Union[None, TreeNode, List[TreeNode]] = None, print_only_highlighted: bool = False):
-    print("\n----- MC tree -----\n" + tree_str(node, highlight_nodes=highlight_nodes, print_only_highlighted=print_only_highlighted))
+def print_tree(
+        node: TreeNode,
+        highlight_nodes: Union[None, TreeNode, Iterable[TreeNode]] = None,
+        print_only_highlighted: bool = False,
+        max_depth: Optional[int] = None,
+        min_visits: int = 0,
+        out: Optional[TextIO] = None
+):
+    out = out if out is not None else sys.stdout
+    out.write("\n----- MC tree -----\n")
+    write_tree(node, out, highlight_nodes=highlight_nodes, print_only_highlighted=print_only_highlighted,
+               max_depth=max_depth, min_visits=min_visits)
+    out.write("\n")
 
 
 if __name__ == '__main__':
@@ -148,7 +466,7 @@ if __name__ == '__main__':
 
     def build_tree():
         # build tree
-        root = TreeNode(None)
+        root = TreeNode(None, next_player=0)
         r1 = TreeNode(None)
         r2 = TreeNode(None)
         r1n1 = TreeNode(None)
@@ -174,13 +492,15 @@ if __name__ == '__main__':
         print_tree(root, highlight_node=expand_node)
 
     def test_backprop():
+        from mcts.mcts_core.mc_tree_policy import UctTreePolicy
+
         root = build_tree()
 
         for i in range(31):
-            expand_node = tree_search(root)
+            expand_node = tree_search(root, UctTreePolicy(uct_c=1))
             backprop_node_value(expand_node, random.randint(-1, 1))
             if i % 3 == 0:
-                print_tree(root, highlight_node=expand_node)
+                print_tree(root, highlight_nodes=expand_node)
 
 
     test_backprop()
\ No newline at end of file
@@ -0,0 +1,141 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from mcts.mcts_core.mc_array_tree import ArrayTreeNode
+from mcts.mcts_core.mc_search_budget import SearchBudget
+from mcts.mcts_core.mc_tree import TreeNode
+from mcts.mcts_core.mc_tree_funcs import TreePolicy, LeafEvaluator, expand_node, count_tree_nodes, EdgePath
+from mcts.mcts_core.state_manager import StateManager
+
+
+class NodeLocks:
+    """
+    A fixed set of locks shared by all nodes, the lock of a node is picked by its hash.
+    The lock of a node guards its visits, its child edges and its expansion
+    """
+
+    def __init__(self, num_locks: int = 64):
+        self._locks = [threading.Lock() for i in range(num_locks)]
+
+    def lock(self, node: TreeNode) -> threading.Lock:
+        return self._locks[hash(node) % len(self._locks)]
+
+
+def _virtual_loss_value(node: TreeNode) -> int:
+    # the loss is counted against the player choosing the edge
+    return -1 if node.next_player == 0 else 1
+
+
+def tree_parallel_simulation(
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy,
+        leaf_evaluator: LeafEvaluator,
+        locks: NodeLocks,
+        virtual_loss: int = 1
+) -> int:
+    """
+    A simulation that can run concurrently with others on the same tree.
+    Every node on the path is locked while its child is chosen and virtual loss is added to the chosen edge,
+    the leaf is evaluated without holding any lock, and the virtual loss is replaced by the value in backprop,
+    reaching every edge by the index recorded during the descent
+    Returns: the number of child nodes added to the tree
+    """
+    edges: EdgePath = []
+    node = root_node
+    nodes_added = 0
+    while True:
+        with locks.lock(node):
+            child = None
+            is_leaf = node.num_children() == 0
+            if is_leaf and expand_node(state_manager, node):
+                nodes_added = node.num_children()
+                index = random.randrange(node.num_children())
+                child = node.get_child(index)
+            elif not is_leaf:
+                index, child = tree_policy.follow_policy_edge(node)
+            node.visits += virtual_loss
+            if child is not None:
+                node.add_to_edge(index, virtual_loss, virtual_loss * _virtual_loss_value(node))
+                edges.append((node, index))
+        if child is None:
+            # a terminal leaf
+            break
+        node = child
+        if is_leaf:
+            # the evaluated child of an expanded leaf
+            with locks.lock(node):
+                node.visits += virtual_loss
+            break
+
+    value = leaf_evaluator.evaluate(node.game_state)
+
+    for edge_node, index in edges:
+        with locks.lock(edge_node):
+            edge_node.visits += 1 - virtual_loss
+            edge_node.add_to_edge(index, 1 - virtual_loss, value - virtual_loss * _virtual_loss_value(edge_node))
+    with locks.lock(node):
+        node.visits += 1 - virtual_loss
+    return nodes_added
+
+
+class SharedSearchProgress:
+    def __init__(self, budget: SearchBudget, root_node: TreeNode):
+        self.budget = budget
+        self.root_node = root_node
+        self.simulations = 0  # started simulations
+        self.tree_nodes = count_tree_nodes(root_node) if root_node.visits != 0 else 1
+        self.stop_reason: Optional[str] = None
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def start_simulation(self) -> bool:
+        """Returns: false if the budget is spent"""
+        with self._lock:
+            if self.stop_reason is None:
+                elapsed = time.perf_counter() - self.start_time
+                self.stop_reason = self.budget.stop_reason(self.root_node, self.simulations, self.tree_nodes, elapsed)
+            if self.stop_reason is not None:
+                return False
+            self.simulations += 1
+            return True
+
+    def add_tree_nodes(self, nodes: int):
+        with self._lock:
+            self.tree_nodes += nodes
+
+
+def perform_tree_parallel_search(
+        state_manager: StateManager,
+        root_node: TreeNode,
+        tree_policy: TreePolicy,
+        leaf_evaluator: LeafEvaluator,
+        budget: SearchBudget,
+        workers: int,
+        virtual_loss: int = 1
+) -> SharedSearchProgress:
+    """
+    Runs simulations in workers threads on the tree of the root node until the budget is spent.
+    ArrayTree trees are not supported, their arrays are reallocated when they grow
+    Returns: the progress of the search, with the number of simulations, tree nodes and the stop reason
+    """
+    if isinstance(root_node, ArrayTreeNode):
+        raise ValueError("tree parallel search does not support the array tree")
+
+    locks = NodeLocks()
+    progress = SharedSearchProgress(budget, root_node)
+
+    def worker():
+        while progress.start_simulation():
+            progress.add_tree_nodes(
+                tree_parallel_simulation(state_manager, root_node, tree_policy, leaf_evaluator, locks, virtual_loss)
+            )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker) for i in range(workers)]
+        for future in futures:
+            future.result()
+    return progress
@@ -1,4 +1,7 @@
 import math
+from typing import Tuple
+
+import numpy as np
 
 from mcts.mcts_core.mc_tree import TreeNode
 from mcts.mcts_core.mc_tree_funcs import TreePolicy
@@ -10,25 +13,74 @@ def uct(const, visits, edge_traversals):
     return const * math.sqrt(log_visits / (1 + edge_traversals))
 
 
+def uct_batch(const, visits, edge_traversals: np.ndarray) -> np.ndarray:
+    """The uct term of every edge at once, log(visits) is only computed once"""
+    log_visits = math.log2(visits) if visits != 0 else 0
+    return const * np.sqrt(log_visits / (1 + edge_traversals))
+
+
 class UctTreePolicy(TreePolicy):
-    def __init__(self, uct_c):
+    def __init__(self, uct_c, vectorized: bool = False, solver: bool = False):
         self.uct_c = uct_c
+        self.vectorized = vectorized
+        self.solver = solver  # skip children proven by the solver, their value is known
 
     def follow_policy(self, node: TreeNode) -> TreeNode:
+        return self.follow_policy_edge(node)[1]
+
+    def follow_policy_edge(self, node: TreeNode) -> Tuple[int, TreeNode]:
         if node.next_player is None or not (0 <= node.next_player <= 1):
             raise ValueError("nodes next player is not assigned")
 
+        if self.vectorized:
+            return self._follow_policy_vectorized(node)
+
         next_player = node.next_player
         uct_sign = 1 if next_player == 0 else -1
+        if not self.solver:
+            return self._follow_policy_iterative(node, uct_sign)
+
         children = node.get_children()
+        edges = node.get_children_edges()
+        indices = range(len(children))
+        unproven = [i for i in indices if children[i].proven_winner is None]
+        if len(unproven) != 0:
+            indices = unproven
         probabilities = [
-            q_value + uct_sign * uct(self.uct_c, node.visits, edge_traversals)
-            for q_value, edge_traversals in
-            [
-                (edge.q_value, edge.traversals)
-                for (child, edge) in zip(children, node.get_children_edges())
-            ]
+            edges[i].q_value + uct_sign * uct(self.uct_c, node.visits, edges[i].traversals)
+            for i in indices
         ]
         pick_child_with_prob_func = max_with_probabilities if next_player == 0 else min_with_probabilities
-        node = pick_child_with_prob_func(children, probabilities)
-        return node
+        child_index = pick_child_with_prob_func(indices, probabilities)
+        return child_index, children[child_index]
+
+    def _follow_policy_iterative(self, node: TreeNode, uct_sign: int) -> Tuple[int, TreeNode]:
+        """
+        The same choice as the list based policy in one pass over the child edges, without building lists.
+        Maximizing uct_sign * q_value + uct is minimizing q_value - uct for the second player, ties go to the first child
+        """
+        log_visits = math.log2(node.visits) if node.visits != 0 else 0
+        best_index = -1
+        best_child = None
+        best_score = -math.inf
+        for index, (child, q_value, edge_traversals) in enumerate(node.iter_children_edge_stats()):
+            score = uct_sign * q_value + self.uct_c * math.sqrt(log_visits / (1 + edge_traversals))
+            if score > best_score or best_child is None:
+                best_index = index
+                best_child = child
+                best_score = score
+        return best_index, best_child
+
+    def _follow_policy_vectorized(self, node: TreeNode) -> Tuple[int, TreeNode]:
+        q_values, traversals = node.get_children_edge_stats()
+        if node.next_player == 0:
+            scores = q_values + uct_batch(self.uct_c, node.visits, traversals)
+        else:
+            scores = -(q_values - uct_batch(self.uct_c, node.visits, traversals))
+        if self.solver:
+            proven = np.fromiter((child.proven_winner is not None for child in node.get_children()), dtype=bool,
+                                 count=len(scores))
+            if not proven.all():
+                scores = np.where(proven, -np.inf, scores)
+        child_index = int(np.argmax(scores))
+        return child_index, node.get_child(child_index)
@@ -0,0 +1,191 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from mcts.mcts_core.mc_tree import TreeNode
+from mcts.mcts_core.state_manager import StateManager, GameState
+
+SNAPSHOT_FORMAT_VERSION = 2
+
+# every array is stored as its own .npy file in the snapshot directory, so each can be memory-mapped
+_SNAPSHOT_ARRAYS = (
+    'visits', 'next_player', 'proven_winner', 'parent', 'first_child', 'num_children',
+    'traversals', 'eval', 'q_value', 'state_offsets', 'state_data'
+)
+
+
+def save_tree_snapshot(root_node: TreeNode, path: str, state_manager: StateManager) -> 'TreeSnapshotHandle':
+    """
+    Writes the tree below the root node to the directory at path.
+    Nodes are stored breadth first, so the children of every node are a contiguous index range.
+    Node i holds the stats of the edge from its parent, states are serialized by the state manager.
+    Nodes shared by several parents are written once per parent
+    """
+    nodes = [root_node]
+    edges = [None]
+    parents = [-1]
+    first_child = []
+    num_children = []
+    i = 0
+    while i < len(nodes):
+        children = nodes[i].get_children()
+        first_child.append(len(nodes) if len(children) != 0 else -1)
+        num_children.append(len(children))
+        nodes.extend(children)
+        edges.extend(nodes[i].get_children_edges())
+        parents.extend([i] * len(children))
+        i += 1
+
+    num_nodes = len(nodes)
+    serialized_states = [state_manager.serialize_state(node.game_state) for node in nodes]
+    state_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in serialized_states], out=state_offsets[1:])
+
+    arrays = {
+        'visits': np.fromiter((node.visits for node in nodes), dtype=np.int64, count=num_nodes),
+        'next_player': np.fromiter(
+            (node.next_player if node.next_player is not None else -1 for node in nodes), dtype=np.int8, count=num_nodes),
+        'proven_winner': np.fromiter(
+            (node.proven_winner if node.proven_winner is not None else -1 for node in nodes), dtype=np.int8, count=num_nodes),
+        'parent': np.array(parents, dtype=np.int64),
+        'first_child': np.array(first_child, dtype=np.int64),
+        'num_children': np.array(num_children, dtype=np.int64),
+        'traversals': np.fromiter((edge.traversals if edge is not None else 0 for edge in edges), dtype=np.int64, count=num_nodes),
+        'eval': np.fromiter((edge.eval if edge is not None else 0 for edge in edges), dtype=np.float64, count=num_nodes),
+        'q_value': np.fromiter((edge.q_value if edge is not None else 0 for edge in edges), dtype=np.float64, count=num_nodes),
+        'state_offsets': state_offsets,
+        'state_data': np.frombuffer(b"".join(serialized_states), dtype=np.uint8)
+    }
+
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'version': SNAPSHOT_FORMAT_VERSION, 'num_nodes': num_nodes}, f)
+
+    return TreeSnapshotHandle(path)
+
+
+@dataclass(frozen=True)
+class TreeSnapshotHandle:
+    """A lightweight reference to a tree snapshot on disk, kept in place of a live tree"""
+    path: str
+
+    def load(self, state_manager: StateManager) -> 'TreeSnapshot':
+        return TreeSnapshot(self.path, state_manager=state_manager)
+
+
+class TreeSnapshot:
+    """
+    A read-only, memory-mapped view of a saved tree. Nothing is read before it is accessed,
+    and states are only deserialized, by the state manager that saved them, when the game_state of a node is requested
+    """
+
+    def __init__(self, path: str, state_manager: StateManager):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"unsupported tree snapshot version {meta['version']}")
+
+        self.path = path
+        self._state_manager = state_manager
+        for name in _SNAPSHOT_ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'))
+
+    def __len__(self):
+        return self.visits.shape[0]
+
+    @property
+    def root(self) -> 'SnapshotNode':
+        return SnapshotNode(self, 0)
+
+    def children_range(self, index: int) -> range:
+        start = int(self.first_child[index])
+        return range(start, start + int(self.num_children[index])) if start != -1 else range(0)
+
+    def game_state(self, index: int) -> GameState:
+        data = self.state_data[self.state_offsets[index]:self.state_offsets[index + 1]].tobytes()
+        return self._state_manager.deserialize_state(data)
+
+
+class SnapshotNodeChildEdge:
+    __slots__ = ('_snapshot', '_index')
+
+    def __init__(self, snapshot: TreeSnapshot, index: int):
+        self._snapshot = snapshot
+        self._index = index
+
+    @property
+    def q_value(self) -> float:
+        return float(self._snapshot.q_value[self._index])
+
+    @property
+    def traversals(self) -> int:
+        return int(self._snapshot.traversals[self._index])
+
+    @property
+    def eval(self) -> float:
+        return float(self._snapshot.eval[self._index])
+
+    def __str__(self):
+        return f"[e={self.eval} t={self.traversals} q={'%.3f' % self.q_value}]"
+
+
+class SnapshotNode:
+    """A read-only node of a TreeSnapshot, with the read interface of TreeNode"""
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot: TreeSnapshot, index: int):
+        self.snapshot = snapshot
+        self.index = index
+
+    @property
+    def game_state(self) -> GameState:
+        return self.snapshot.game_state(self.index)
+
+    @property
+    def visits(self) -> int:
+        return int(self.snapshot.visits[self.index])
+
+    @property
+    def next_player(self) -> Optional[int]:
+        next_player = int(self.snapshot.next_player[self.index])
+        return next_player if next_player != -1 else None
+
+    @property
+    def proven_winner(self) -> Optional[int]:
+        proven_winner = int(self.snapshot.proven_winner[self.index])
+        return proven_winner if proven_winner != -1 else None
+
+    @property
+    def parent(self) -> Optional['SnapshotNode']:
+        parent_index = int(self.snapshot.parent[self.index])
+        return SnapshotNode(self.snapshot, parent_index) if parent_index != -1 else None
+
+    def get_children(self) -> List['SnapshotNode']:
+        return [SnapshotNode(self.snapshot, i) for i in self.snapshot.children_range(self.index)]
+
+    def get_children_edges(self) -> List[SnapshotNodeChildEdge]:
+        return [SnapshotNodeChildEdge(self.snapshot, i) for i in self.snapshot.children_range(self.index)]
+
+    def get_child(self, index: int) -> 'SnapshotNode':
+        return SnapshotNode(self.snapshot, int(self.snapshot.first_child[self.index]) + index)
+
+    def get_children_edge_stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        children = self.snapshot.children_range(self.index)
+        return self.snapshot.q_value[children.start:children.stop], self.snapshot.traversals[children.start:children.stop]
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotNode) and other.snapshot is self.snapshot and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.snapshot), self.index))
+
+    def __str__(self):
+        return f"(visits={self.visits} next_player={self.next_player} state={self.game_state})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,6 +1,11 @@
+import functools
+import pickle
+import random
 from abc import ABC, abstractmethod
-from typing import List, Optional, Any
+from dataclasses import dataclass
+from typing import List, Optional, Any, Dict
 
+import numpy as np
 
 GameState = Any
 
@@ -26,3 +31,163 @@ class StateManager(ABC):
     @abstractmethod
     def action_str(self, state: GameState, previous_state: Optional[GameState]) -> str:
         pass
+
+    # Optional extensions, override them when successors can be counted or created one at a time
+
+    def get_legal_action_count(self, state: GameState) -> int:
+        """The number of successor states of the given state"""
+        return len(self.get_successor_states(state))
+
+    def apply_action(self, state: GameState, action_index: int) -> GameState:
+        """The successor state at the given index of get_successor_states"""
+        return self.get_successor_states(state)[action_index]
+
+    def sample_successor_state(self, state: GameState) -> GameState:
+        """A uniformly random successor state"""
+        return random.choice(self.get_successor_states(state))
+
+    def get_player_to_move(self, state: GameState) -> Optional[int]:
+        """The player making the next move from the state, None if the states do not record it"""
+        return None
+
+    def serialize_state(self, state: GameState) -> bytes:
+        """A compact binary encoding of the state, the inverse of deserialize_state"""
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def deserialize_state(self, data: bytes) -> GameState:
+        return pickle.loads(data)
+
+    def encode_state(self, state: GameState) -> np.ndarray:
+        """
+        A fixed size numeric encoding of the state, used as input features of training data
+        The default converts states that are numbers or sequences of numbers, override it for any other state
+        """
+        return np.asarray(state, dtype=np.float64)
+
+    def batch_rollout(self, state: GameState, num_rollouts: int) -> np.ndarray:
+        """
+        Plays num_rollouts uniformly random games from the given state
+        Override with a vectorized implementation for games with a numpy representation
+        Returns: the winning player of every game
+        """
+        winners = np.empty(num_rollouts, dtype=np.int8)
+        for i in range(num_rollouts):
+            rollout_state = state
+            while not self.is_terminal_state(rollout_state):
+                rollout_state = self.sample_successor_state(rollout_state)
+            winners[i] = self.player_won(rollout_state)
+        return winners
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups != 0 else 0
+
+
+class CachingStateManager(StateManager):
+    """
+    Wraps any state manager and memoizes successor states, terminality and the winner of states.
+    Every cache holds at most max_entries states, the least recently used state is evicted first.
+    Game states must be hashable.
+    The cached successor lists are shared between calls, hence they must not be mutated.
+    """
+
+    def __init__(self, state_manager: StateManager, max_entries: int = 100000):
+        if max_entries <= 0:
+            raise ValueError("cache size must be positive")
+        self.state_manager = state_manager
+        self.max_entries = max_entries
+        self._create_caches()
+
+    def _create_caches(self):
+        self._cached_funcs = {
+            name: functools.lru_cache(maxsize=self.max_entries)(getattr(self.state_manager, name))
+            for name in ('get_successor_states', 'is_terminal_state', 'player_won')
+        }
+        # the optional extensions the wrapped manager overrides
+        self._native_extensions = frozenset(
+            name for name in ('get_legal_action_count', 'apply_action', 'sample_successor_state')
+            if getattr(type(self.state_manager), name) is not getattr(StateManager, name)
+        )
+
+    def __getstate__(self):
+        # lru caches can not be pickled, they are rebuilt empty
+        return {'state_manager': self.state_manager, 'max_entries': self.max_entries}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_caches()
+
+    def get_initial_state(self) -> GameState:
+        return self.state_manager.get_initial_state()
+
+    def get_successor_states(self, state: GameState) -> List[GameState]:
+        return self._cached_funcs['get_successor_states'](state)
+
+    def is_terminal_state(self, state: GameState) -> bool:
+        return self._cached_funcs['is_terminal_state'](state)
+
+    def player_won(self, state: GameState) -> int:
+        return self._cached_funcs['player_won'](state)
+
+    def action_str(self, state: GameState, previous_state: Optional[GameState]) -> str:
+        return self.state_manager.action_str(state, previous_state)
+
+    # the optional extensions of the wrapped manager are used when it implements them natively,
+    # otherwise they fall back to the cached successor lists
+
+    def get_legal_action_count(self, state: GameState) -> int:
+        if 'get_legal_action_count' in self._native_extensions:
+            return self.state_manager.get_legal_action_count(state)
+        return super().get_legal_action_count(state)
+
+    def apply_action(self, state: GameState, action_index: int) -> GameState:
+        if 'apply_action' in self._native_extensions:
+            return self.state_manager.apply_action(state, action_index)
+        return super().apply_action(state, action_index)
+
+    def sample_successor_state(self, state: GameState) -> GameState:
+        if 'sample_successor_state' in self._native_extensions:
+            return self.state_manager.sample_successor_state(state)
+        return super().sample_successor_state(state)
+
+    def get_player_to_move(self, state: GameState) -> Optional[int]:
+        return self.state_manager.get_player_to_move(state)
+
+    def batch_rollout(self, state: GameState, num_rollouts: int) -> np.ndarray:
+        return self.state_manager.batch_rollout(state, num_rollouts)
+
+    def serialize_state(self, state: GameState) -> bytes:
+        return self.state_manager.serialize_state(state)
+
+    def deserialize_state(self, data: bytes) -> GameState:
+        return self.state_manager.deserialize_state(data)
+
+    def encode_state(self, state: GameState) -> np.ndarray:
+        return self.state_manager.encode_state(state)
+
+    def cache_stats(self) -> Dict[str, CacheStats]:
+        stats = {}
+        for name, cached_func in self._cached_funcs.items():
+            info = cached_func.cache_info()
+            stats[name] = CacheStats(
+                hits=info.hits,
+                misses=info.misses,
+                # every miss inserts an entry, the ones not in the cache anymore were evicted
+                evictions=info.misses - info.currsize,
+                size=info.currsize
+            )
+        return stats
+
+    def clear_cache(self):
+        """Empties the caches and resets their stats"""
+        for cached_func in self._cached_funcs.values():
+            cached_func.cache_clear()
@@ -0,0 +1,184 @@
+import random
+from collections import deque
+from typing import List, Optional, Dict
+
+import numpy as np
+
+from mcts.mcts_core.state_manager import StateManager, GameState
+from mcts.mcts_core.utils import two_player_other_player
+
+
+class TabulatedStateManager(StateManager):
+    """
+    Enumerates every state reachable in a small finite game once and serves the rules from tables.
+    States are the integer indices of the enumerated states, the initial state is 0.
+    Successors are stored as index arrays, and the winner with perfect play of every state is found by retrograde analysis.
+    The game must alternate between the players, starting_player being the player to move in the initial state.
+    It is taken from get_player_to_move of the game if not given, and must agree with it if both are known
+    """
+
+    def __init__(self, state_manager: StateManager, starting_player: Optional[int] = None, max_states: int = 1000000):
+        self.state_manager = state_manager
+        self.states: List[GameState] = []
+        self._state_indices: Dict[GameState, int] = {}
+        game_starting_player = state_manager.get_player_to_move(state_manager.get_initial_state())
+        if starting_player is None:
+            if game_starting_player is None:
+                raise ValueError("the game does not record the player to move, starting_player must be given")
+            starting_player = game_starting_player
+        elif game_starting_player is not None and starting_player != game_starting_player:
+            raise ValueError(f"starting_player is {starting_player}, "
+                             f"but player {game_starting_player} moves first in the initial state of the game")
+        self._enumerate_states(starting_player, max_states)
+        self._solve()
+
+    def _add_state(self, state: GameState, player_to_move: int, player_to_move_list: List[int]) -> int:
+        index = self._state_indices.get(state)
+        if index is None:
+            index = len(self.states)
+            self._state_indices[state] = index
+            self.states.append(state)
+            player_to_move_list.append(player_to_move)
+        elif player_to_move_list[index] != player_to_move:
+            raise ValueError(f"state {state} is reached with both players to move")
+        return index
+
+    def _enumerate_states(self, starting_player: int, max_states: int):
+        player_to_move = []
+        self._add_state(self.state_manager.get_initial_state(), starting_player, player_to_move)
+        successor_lists = []
+        # breadth first, so states are numbered by their distance from the initial state
+        for index, state in enumerate(self.states):
+            if index == max_states:
+                raise ValueError(f"the game has more than {max_states} reachable states")
+            if self.state_manager.is_terminal_state(state):
+                successor_lists.append(())
+                continue
+            successor_player = two_player_other_player(player_to_move[index])
+            successor_lists.append(tuple(
+                self._add_state(successor, successor_player, player_to_move)
+                for successor in self.state_manager.get_successor_states(state)
+            ))
+
+        num_states = len(self.states)
+        self._successor_lists = successor_lists
+        self.player_to_move = np.array(player_to_move, dtype=np.int8)
+        self.successor_offsets = np.zeros(num_states + 1, dtype=np.int64)
+        np.cumsum([len(successors) for successors in successor_lists], out=self.successor_offsets[1:])
+        self.successor_indices = np.fromiter(
+            (successor for successors in successor_lists for successor in successors),
+            dtype=np.int64, count=self.successor_offsets[-1])
+        self.is_terminal = np.array([self.state_manager.is_terminal_state(state) for state in self.states], dtype=bool)
+        self.terminal_winner = np.array([
+            self.state_manager.player_won(state) if terminal else -1
+            for state, terminal in zip(self.states, self.is_terminal)
+        ], dtype=np.int8)
+
+    def _solve(self):
+        """Retrograde analysis from the terminal states, states on cycles that cannot be decided are left at -1"""
+        num_states = len(self.states)
+        self.winner = self.terminal_winner.copy()
+        unsolved_successors = np.diff(self.successor_offsets)
+        predecessors = [[] for i in range(num_states)]
+        for index, successors in enumerate(self._successor_lists):
+            for successor in successors:
+                predecessors[successor].append(index)
+
+        solved = deque(np.flatnonzero(self.is_terminal).tolist())
+        while len(solved) > 0:
+            index = solved.popleft()
+            winner = self.winner[index]
+            for predecessor in predecessors[index]:
+                if self.winner[predecessor] != -1:
+                    continue
+                # the player to move wins with one winning successor and loses when every successor is lost
+                player = self.player_to_move[predecessor]
+                unsolved_successors[predecessor] -= 1
+                if winner == player:
+                    self.winner[predecessor] = player
+                    solved.append(predecessor)
+                elif unsolved_successors[predecessor] == 0:
+                    self.winner[predecessor] = two_player_other_player(int(player))
+                    solved.append(predecessor)
+
+    def __len__(self):
+        return len(self.states)
+
+    def index_of(self, state: GameState) -> int:
+        return self._state_indices[state]
+
+    def game_value(self, state: int) -> int:
+        """The winner with perfect play from the state, -1 if it is undecided"""
+        return int(self.winner[state])
+
+    def optimal_actions(self, state: int) -> List[int]:
+        """The action indices keeping the best outcome for the player to move, all of them if every action loses"""
+        successors = self._successor_lists[state]
+        player = self.player_to_move[state]
+        winning = [i for i, successor in enumerate(successors) if self.winner[successor] == player]
+        return winning if len(winning) != 0 else list(range(len(successors)))
+
+    def get_initial_state(self) -> int:
+        return 0
+
+    def get_successor_states(self, state: int) -> List[int]:
+        return list(self._successor_lists[state])
+
+    def get_legal_action_count(self, state: int) -> int:
+        return len(self._successor_lists[state])
+
+    def apply_action(self, state: int, action_index: int) -> int:
+        return self._successor_lists[state][action_index]
+
+    def sample_successor_state(self, state: int) -> int:
+        return random.choice(self._successor_lists[state])
+
+    def get_player_to_move(self, state: int) -> int:
+        return int(self.player_to_move[state])
+
+    def is_terminal_state(self, state: int) -> bool:
+        return bool(self.is_terminal[state])
+
+    def player_won(self, state: int) -> int:
+        return int(self.terminal_winner[state])
+
+    def batch_rollout(self, state: int, num_rollouts: int) -> np.ndarray:
+        rng = np.random.default_rng(random.getrandbits(64))
+        states = np.full(num_rollouts, state, dtype=np.int64)
+        active = ~self.is_terminal[states]
+        while active.any():
+            active_states = states[active]
+            offsets = self.successor_offsets[active_states]
+            num_successors = self.successor_offsets[active_states + 1] - offsets
+            states[active] = self.successor_indices[offsets + rng.integers(0, num_successors)]
+            active = ~self.is_terminal[states]
+        return self.terminal_winner[states]
+
+    def serialize_state(self, state: int) -> bytes:
+        return int(state).to_bytes(8, 'little')
+
+    def deserialize_state(self, data: bytes) -> int:
+        return int.from_bytes(data, 'little')
+
+    def encode_state(self, state: int) -> np.ndarray:
+        return self.state_manager.encode_state(self.states[state])
+
+    def action_str(self, state: int, previous_state: Optional[int]) -> str:
+        return self.state_manager.action_str(
+            self.states[state],
+            self.states[previous_state] if previous_state is not None else None
+        )
+
+
+if __name__ == '__main__':
+    from mcts.test_games.nim_state_manager import NimStateManager
+
+    def check_nim_closed_form(num_pieces: int, max_remove: int):
+        nim_state_manager = NimStateManager(num_pieces, max_remove, 0)
+        tabulated = TabulatedStateManager(nim_state_manager)
+        for index, state in enumerate(tabulated.states):
+            if tabulated.game_value(index) != nim_state_manager.game_value(state):
+                raise AssertionError(f"retrograde value of {state} differs from the closed form")
+        print(f"nim {num_pieces}/{max_remove}: {len(tabulated)} states match the closed form")
+
+    check_nim_closed_form(50, 5)
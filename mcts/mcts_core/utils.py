@@ -14,10 +14,10 @@ def min_with_probabilities(elements: List[any], probabilities: List[float]):
 
 
 def repeat_str(length, s):
-    return "".join([s for i in range(length)])
+    return s * max(length, 0)
 
 def spaces_of_len(length: int) -> str:
-    return "".join([" " for i in range(length)])
+    return " " * max(length, 0)
 
 def fixed_size_str_center(length: int, s: str, fill=" ") -> str:
     if len(s) > length:
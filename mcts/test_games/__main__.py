@@ -1,20 +1,15 @@
 import mcts.mcts_core.game_simulator as mcts
+from mcts.test_games import ledge_boards
 from mcts.test_games.ledge_state_manager import LedgeGameConfig, LedgeStateManager
 
 print("Running test games")
 
 
 def run_ledge():
-    ledge_board_small = [0, 1, 1, 0, 2]
-    ledge_board_from_notes = [0, 0, 0, 1, 0, 2, 0, 0, 1, 0]
-    ledge_board_large = [0, 0, 0, 1, 1, 1, 0, 0, 1, 0, 2, 1, 0, 0, 1, 0, 1, 0, 0, 1]
-    ledge_board_another_test = [0, 1, 2, 1, 0, 0, 1]
-    ledge_board_last_test = [0, 1, 0, 1, 0, 1, 0, 1, 0, 0, 2, 0, 0, 1, 1, 1]
-
     starting_player = 1
 
     ledge_state_manager = LedgeStateManager(LedgeGameConfig(
-        initial_board=ledge_board_another_test,
+        initial_board=ledge_boards.ledge_board_another_test,
         starting_player=starting_player
     ))
 
@@ -0,0 +1,191 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from mcts.mcts_core.action_state_manager import InPlaceActionStateManager
+from mcts.test_games.ledge_state_manager import LedgeGameConfig, LedgeState
+
+LEDGE_PICK_ACTION = -1  # picking up the coin in cell 0
+_SOURCE_SHIFT = 8  # a move is source << _SOURCE_SHIFT | target
+
+
+@dataclass(eq=True)
+class MutableLedgeState:
+    """
+    A LedgeState whose fields can be changed in place.
+    States are hashable, like LedgeState, so they can be cached and shared by transposition tables,
+    a state must not be changed in place while it is a key
+    """
+    initial_state: bool
+    board: List[int]
+    coin_pick: int  # -1 if no coin was picked
+    player: int  # the player who made the last move
+
+    def __hash__(self):
+        return hash((self.initial_state, tuple(self.board), self.coin_pick, self.player))
+
+    def to_ledge_state(self) -> LedgeState:
+        return LedgeState(initial_state=self.initial_state, board=tuple(self.board), coin_pick=self.coin_pick,
+                          player=self.player)
+
+    @staticmethod
+    def from_ledge_state(state: LedgeState) -> 'MutableLedgeState':
+        return MutableLedgeState(initial_state=state.initial_state, board=list(state.board), coin_pick=state.coin_pick,
+                                 player=state.player)
+
+
+def ledge_move_action(source: int, target: int) -> int:
+    return source << _SOURCE_SHIFT | target
+
+
+def ledge_move_cells(action: int) -> Tuple[int, int]:
+    """Returns: the source and target cell of a move action"""
+    return action >> _SOURCE_SHIFT, action & ((1 << _SOURCE_SHIFT) - 1)
+
+
+class LedgeActionStateManager(InPlaceActionStateManager):
+    """
+    The rules of LedgeStateManager as actions on mutable states, which are applied in place during rollouts.
+    Actions are in the order of the successors of LedgeStateManager, so action i leads to its successor i
+    """
+
+    def __init__(self, config: LedgeGameConfig):
+        self._initial_board = list(config.initial_board)
+        self._starting_player = config.starting_player
+
+    def get_initial_state(self) -> MutableLedgeState:
+        return MutableLedgeState(
+            initial_state=True,
+            board=list(self._initial_board),
+            coin_pick=-1,
+            player=(self._starting_player + 1) % 2
+        )
+
+    def legal_actions(self, state: MutableLedgeState) -> List[int]:
+        board = state.board
+        actions = [LEDGE_PICK_ACTION] if board[0] != 0 else []
+        prev_coin_index = -1
+        for coin_index, coin_type in enumerate(board):
+            if coin_type != 0:
+                for target in range(coin_index - 1, prev_coin_index, -1):
+                    actions.append(coin_index << _SOURCE_SHIFT | target)
+                prev_coin_index = coin_index
+        return actions
+
+    def apply(self, state: MutableLedgeState, action: int) -> MutableLedgeState:
+        successor = MutableLedgeState(state.initial_state, list(state.board), state.coin_pick, state.player)
+        self.apply_in_place(successor, action)
+        return successor
+
+    def apply_in_place(self, state: MutableLedgeState, action: int) -> Tuple[bool, int]:
+        undo_info = (state.initial_state, state.coin_pick)
+        board = state.board
+        if action == LEDGE_PICK_ACTION:
+            state.coin_pick = board[0]
+            board[0] = 0
+        else:
+            source, target = ledge_move_cells(action)
+            board[target] = board[source]
+            board[source] = 0
+            state.coin_pick = -1
+        state.initial_state = False
+        state.player ^= 1
+        return undo_info
+
+    def undo(self, state: MutableLedgeState, action: int, undo_info: Tuple[bool, int]):
+        board = state.board
+        if action == LEDGE_PICK_ACTION:
+            board[0] = state.coin_pick
+        else:
+            source, target = ledge_move_cells(action)
+            board[source] = board[target]
+            board[target] = 0
+        state.initial_state, state.coin_pick = undo_info
+        state.player ^= 1
+
+    def is_terminal_state(self, state: MutableLedgeState) -> bool:
+        return state.coin_pick == 2
+
+    def player_won(self, state: MutableLedgeState) -> int:
+        if self.is_terminal_state(state):
+            return state.player
+        else:
+            return -1
+
+    def state_str(self, state: MutableLedgeState) -> str:
+        return f"Start Board: {tuple(state.board)}"
+
+    def action_str(self, state: MutableLedgeState, action: int) -> str:
+        player = state.player ^ 1
+        successor = self.apply(state, action)
+        if action == LEDGE_PICK_ACTION:
+            if successor.coin_pick == 2:
+                return f"Player {player} picks up gold: {tuple(successor.board)}\nPlayer {player} wins"
+            return f"Player {player} picks up copper: {tuple(successor.board)}"
+        source, target = ledge_move_cells(action)
+        coin_type_str = "gold" if state.board[source] == 2 else "copper"
+        return f"player {player} moves {coin_type_str} from cell {source} to {target}: {tuple(successor.board)}"
+
+
+if __name__ == '__main__':
+    import random
+    import timeit
+
+    from mcts.mcts_core.action_state_manager import ActionBackedStateManager
+    from mcts.test_games.ledge_boards import ledge_board_large
+    from mcts.test_games.ledge_state_manager import LedgeStateManager
+
+    def check_equivalent_actions(num_games: int = 200):
+        config = LedgeGameConfig(initial_board=ledge_board_large)
+        ledge_state_manager = LedgeStateManager(config)
+        action_state_manager = LedgeActionStateManager(config)
+        backed_state_manager = ActionBackedStateManager(action_state_manager)
+        for i in range(num_games):
+            state = ledge_state_manager.get_initial_state()
+            mutable_state = action_state_manager.get_initial_state()
+            while True:
+                if mutable_state.to_ledge_state() != state:
+                    raise AssertionError(f"states differ: {state} {mutable_state}")
+                successors = ledge_state_manager.get_successor_states(state)
+                actions = action_state_manager.legal_actions(mutable_state)
+                if [action_state_manager.apply(mutable_state, action).to_ledge_state() for action in actions] != successors:
+                    raise AssertionError(f"successors of {state} differ")
+                for action in actions:
+                    before = action_state_manager.apply(mutable_state, action)
+                    undo_info = action_state_manager.apply_in_place(mutable_state, action)
+                    action_state_manager.undo(mutable_state, action, undo_info)
+                    if mutable_state.to_ledge_state() != state:
+                        raise AssertionError(f"undo of {before} does not restore {state}")
+                if ledge_state_manager.is_terminal_state(state):
+                    if action_state_manager.player_won(mutable_state) != ledge_state_manager.player_won(state):
+                        raise AssertionError(f"winner of {state} differs")
+                    break
+                action_index = random.randrange(len(successors))
+                mutable_successor = action_state_manager.apply(mutable_state, actions[action_index])
+                if backed_state_manager.action_str(mutable_successor, mutable_state) != \
+                        ledge_state_manager.action_str(successors[action_index], state):
+                    raise AssertionError(f"action strings of {state} differ")
+                state = successors[action_index]
+                mutable_state = mutable_successor
+
+    def benchmark_rollouts(number: int = 2000):
+        config = LedgeGameConfig(initial_board=ledge_board_large)
+        ledge_state_manager = LedgeStateManager(config)
+        action_state_manager = LedgeActionStateManager(config)
+
+        def successor_rollout(state=ledge_state_manager.get_initial_state()):
+            while not ledge_state_manager.is_terminal_state(state):
+                state = ledge_state_manager.sample_successor_state(state)
+            return ledge_state_manager.player_won(state)
+
+        initial_state = action_state_manager.get_initial_state()
+        print(f"{'rollout':>12} {'us':>8}")
+        for name, rollout in [("successors", successor_rollout),
+                              ("in place", lambda: action_state_manager.rollout(initial_state))]:
+            random.seed(0)
+            print(f"{name:>12} {timeit.timeit(rollout, number=number) / number * 1e6:>8.1f}")
+        if initial_state != action_state_manager.get_initial_state():
+            raise AssertionError("in place rollouts changed the state")
+
+    random.seed(0)
+    check_equivalent_actions()
+    benchmark_rollouts()
@@ -0,0 +1,250 @@
+import random
+from typing import List, Optional
+
+import numpy as np
+
+from mcts.mcts_core.state_manager import StateManager
+from mcts.test_games.ledge_state_manager import LedgeGameConfig, LedgeState, LedgeStateManager
+
+# layout of a packed state, from the least significant bit
+_COIN_PICK_MASK = 0b11  # the picked coin type, 0 if no coin was picked
+_PLAYER_BIT = 1 << 2
+_INITIAL_BIT = 1 << 3
+_LENGTH_SHIFT = 4  # 6 bits of board length
+_LENGTH_MASK = 0b111111
+_BOARD_SHIFT = 10  # 2 bits per cell holding the coin type, cell 0 in the lowest bits
+
+MAX_BOARD_LENGTH = _LENGTH_MASK
+
+
+class PackedLedgeState(int):
+    """
+    A ledge state packed into one integer, see the layout above.
+    Hashing and equality are those of int, the repr shows the equivalent LedgeState
+    """
+    __slots__ = ()
+
+    @property
+    def coin_pick(self) -> int:
+        coin_pick = self & _COIN_PICK_MASK
+        return coin_pick if coin_pick != 0 else -1
+
+    @property
+    def player(self) -> int:
+        return 1 if self & _PLAYER_BIT else 0
+
+    @property
+    def initial_state(self) -> bool:
+        return bool(self & _INITIAL_BIT)
+
+    @property
+    def board_length(self) -> int:
+        return (self >> _LENGTH_SHIFT) & _LENGTH_MASK
+
+    @property
+    def board(self) -> int:
+        return self >> _BOARD_SHIFT
+
+    def to_ledge_state(self) -> LedgeState:
+        board = self.board
+        return LedgeState(
+            initial_state=self.initial_state,
+            board=tuple((board >> (2 * cell)) & 0b11 for cell in range(self.board_length)),
+            coin_pick=self.coin_pick,
+            player=self.player
+        )
+
+    def __repr__(self):
+        return repr(self.to_ledge_state())
+
+
+def pack_ledge_state(state: LedgeState) -> PackedLedgeState:
+    if len(state.board) > MAX_BOARD_LENGTH:
+        raise ValueError(f"packed ledge boards have at most {MAX_BOARD_LENGTH} cells")
+    board = 0
+    for cell, coin_type in enumerate(state.board):
+        board |= coin_type << (2 * cell)
+    return PackedLedgeState(
+        board << _BOARD_SHIFT
+        | len(state.board) << _LENGTH_SHIFT
+        | (_INITIAL_BIT if state.initial_state else 0)
+        | (_PLAYER_BIT if state.player == 1 else 0)
+        | (state.coin_pick if state.coin_pick != -1 else 0)
+    )
+
+
+class BitboardLedgeStateManager(StateManager):
+    """
+    The rules of LedgeStateManager on packed states, with moves generated by bit operations.
+    Successors are equal, and in the same order, as those of LedgeStateManager after conversion with to_ledge_state
+    """
+
+    def __init__(self, config: LedgeGameConfig):
+        self._ledge_state_manager = LedgeStateManager(config)
+        self._initial_state = pack_ledge_state(self._ledge_state_manager.get_initial_state())
+        board_length = len(config.initial_board)
+        self._length_bits = board_length << _LENGTH_SHIFT
+        self._cells_low_bit = sum(1 << (2 * cell) for cell in range(board_length))  # the low bit of every cell
+
+    def to_ledge_state(self, state: PackedLedgeState) -> LedgeState:
+        return state.to_ledge_state()
+
+    def from_ledge_state(self, state: LedgeState) -> PackedLedgeState:
+        return pack_ledge_state(state)
+
+    def get_initial_state(self) -> PackedLedgeState:
+        return self._initial_state
+
+    def _coin_cells_mask(self, board: int) -> int:
+        """The low bit of every cell holding a coin"""
+        return (board | board >> 1) & self._cells_low_bit
+
+    def get_successor_states(self, state: PackedLedgeState) -> List[PackedLedgeState]:
+        board = state >> _BOARD_SHIFT
+        successor_meta = self._length_bits | (0 if state & _PLAYER_BIT else _PLAYER_BIT)
+        successor_states = []
+
+        # successor state when picking coin
+        first_coin = board & 0b11
+        if first_coin != 0:
+            successor_states.append(PackedLedgeState((board & ~0b11) << _BOARD_SHIFT | successor_meta | first_coin))
+
+        # successor states when moving coins, to every empty cell between a coin and the previous one
+        coins = self._coin_cells_mask(board)
+        prev_coin_bit = -2
+        while coins:
+            coin_low_bit = coins & -coins
+            coin_bit = coin_low_bit.bit_length() - 1
+            coin_type = (board >> coin_bit) & 0b11
+            board_without_coin = board ^ (coin_type << coin_bit)
+            for target_bit in range(coin_bit - 2, prev_coin_bit, -2):
+                successor_states.append(PackedLedgeState(
+                    (board_without_coin | coin_type << target_bit) << _BOARD_SHIFT | successor_meta
+                ))
+            prev_coin_bit = coin_bit
+            coins ^= coin_low_bit
+        return successor_states
+
+    def get_legal_action_count(self, state: PackedLedgeState) -> int:
+        board = state >> _BOARD_SHIFT
+        coins = self._coin_cells_mask(board)
+        if coins == 0:
+            return 0
+        # every empty cell left of the last coin is a target for the first coin to its right
+        last_coin_cell = (coins.bit_length() - 1) // 2
+        num_moves = last_coin_cell + 1 - bin(coins).count("1")
+        return num_moves + (1 if board & 0b11 else 0)
+
+    def apply_action(self, state: PackedLedgeState, action_index: int) -> PackedLedgeState:
+        # same action order as get_successor_states
+        board = state >> _BOARD_SHIFT
+        successor_meta = self._length_bits | (0 if state & _PLAYER_BIT else _PLAYER_BIT)
+        first_coin = board & 0b11
+        if first_coin != 0:
+            if action_index == 0:
+                return PackedLedgeState((board & ~0b11) << _BOARD_SHIFT | successor_meta | first_coin)
+            action_index -= 1
+
+        coins = self._coin_cells_mask(board)
+        prev_coin_bit = -2
+        while coins:
+            coin_low_bit = coins & -coins
+            coin_bit = coin_low_bit.bit_length() - 1
+            num_coin_moves = (coin_bit - prev_coin_bit) // 2 - 1
+            if action_index < num_coin_moves:
+                coin_type = (board >> coin_bit) & 0b11
+                target_bit = coin_bit - 2 * (action_index + 1)
+                return PackedLedgeState(
+                    (board ^ (coin_type << coin_bit) | coin_type << target_bit) << _BOARD_SHIFT | successor_meta
+                )
+            action_index -= num_coin_moves
+            prev_coin_bit = coin_bit
+            coins ^= coin_low_bit
+
+        raise IndexError("action index out of range")
+
+    def sample_successor_state(self, state: PackedLedgeState) -> PackedLedgeState:
+        return self.apply_action(state, random.randrange(self.get_legal_action_count(state)))
+
+    def batch_rollout(self, state: PackedLedgeState, num_rollouts: int) -> np.ndarray:
+        return self._ledge_state_manager.batch_rollout(state.to_ledge_state(), num_rollouts)
+
+    def is_terminal_state(self, state: PackedLedgeState) -> bool:
+        return state & _COIN_PICK_MASK == 2
+
+    def get_player_to_move(self, state: PackedLedgeState) -> int:
+        return 0 if state & _PLAYER_BIT else 1
+
+    def player_won(self, state: PackedLedgeState) -> int:
+        if self.is_terminal_state(state):
+            return 1 if state & _PLAYER_BIT else 0
+        else:
+            return -1
+
+    def serialize_state(self, state: PackedLedgeState) -> bytes:
+        return state.to_bytes((state.bit_length() + 7) // 8, 'little')
+
+    def deserialize_state(self, data: bytes) -> PackedLedgeState:
+        return PackedLedgeState(int.from_bytes(data, 'little'))
+
+    def encode_state(self, state: PackedLedgeState) -> np.ndarray:
+        return self._ledge_state_manager.encode_state(state.to_ledge_state())
+
+    def action_str(self, state: PackedLedgeState, previous_state: Optional[PackedLedgeState]) -> str:
+        return self._ledge_state_manager.action_str(
+            state.to_ledge_state(),
+            previous_state.to_ledge_state() if previous_state is not None else None
+        )
+
+
+if __name__ == '__main__':
+    import timeit
+
+    from mcts.mcts_core.game_simulator import GameSimulatorConfig, create_root_node, create_tree_policy, perform_search
+    from mcts.mcts_core.mc_default_policy import RandomDefaultPolicy
+    from mcts.test_games.ledge_boards import ledge_board_large
+
+    def check_equivalent_successors(state_managers, num_games: int = 200):
+        ledge_state_manager, bitboard_state_manager = state_managers
+        for i in range(num_games):
+            state = ledge_state_manager.get_initial_state()
+            packed_state = bitboard_state_manager.get_initial_state()
+            while True:
+                if pack_ledge_state(state) != packed_state or packed_state.to_ledge_state() != state:
+                    raise AssertionError(f"states differ: {state} {packed_state}")
+                successors = ledge_state_manager.get_successor_states(state)
+                packed_successors = bitboard_state_manager.get_successor_states(packed_state)
+                if [pack_ledge_state(successor) for successor in successors] != packed_successors:
+                    raise AssertionError(f"successors of {state} differ")
+                if bitboard_state_manager.get_legal_action_count(packed_state) != len(successors):
+                    raise AssertionError(f"action count of {state} differs")
+                if ledge_state_manager.is_terminal_state(state):
+                    if bitboard_state_manager.player_won(packed_state) != ledge_state_manager.player_won(state):
+                        raise AssertionError(f"winner of {state} differs")
+                    break
+                action_index = random.randrange(len(successors))
+                state = successors[action_index]
+                packed_state = bitboard_state_manager.apply_action(packed_state, action_index)
+
+    def benchmark_bitboard(state_managers):
+        number = 5000
+        simulations = 2000
+        print(f"{'engine':>10} {'successors (us)':>16} {'hash (us)':>10} {'sims/s':>8}")
+        for name, state_manager in zip(["tuple", "bitboard"], state_managers):
+            initial_state = state_manager.get_initial_state()
+            successors_us = timeit.timeit(lambda: state_manager.get_successor_states(initial_state), number=number) / number * 1e6
+            hash_us = timeit.timeit(lambda: {hash(state) for state in state_manager.get_successor_states(initial_state)},
+                                    number=number) / number * 1e6 - successors_us
+
+            random.seed(0)
+            config = GameSimulatorConfig(state_manager, verbose=False, simulations_per_move=simulations)
+            root_node = create_root_node(initial_state, 0)
+            stats = perform_search(config, state_manager, root_node, create_tree_policy(config),
+                                   RandomDefaultPolicy(state_manager=state_manager))
+            print(f"{name:>10} {successors_us:>16.2f} {hash_us:>10.2f} {stats.simulations / stats.elapsed:>8.0f}")
+
+    random.seed(0)
+    ledge_config = LedgeGameConfig(initial_board=ledge_board_large)
+    ledge_state_managers = (LedgeStateManager(ledge_config), BitboardLedgeStateManager(ledge_config))
+    check_equivalent_successors(ledge_state_managers)
+    benchmark_bitboard(ledge_state_managers)
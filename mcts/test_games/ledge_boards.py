@@ -0,0 +1,13 @@
+ledge_board_small = [0, 1, 1, 0, 2]
+ledge_board_from_notes = [0, 0, 0, 1, 0, 2, 0, 0, 1, 0]
+ledge_board_large = [0, 0, 0, 1, 1, 1, 0, 0, 1, 0, 2, 1, 0, 0, 1, 0, 1, 0, 0, 1]
+ledge_board_another_test = [0, 1, 2, 1, 0, 0, 1]
+ledge_board_last_test = [0, 1, 0, 1, 0, 1, 0, 1, 0, 0, 2, 0, 0, 1, 1, 1]
+
+ledge_boards = {
+    'small': ledge_board_small,
+    'from_notes': ledge_board_from_notes,
+    'large': ledge_board_large,
+    'another_test': ledge_board_another_test,
+    'last_test': ledge_board_last_test
+}
@@ -2,6 +2,8 @@ import random
 from dataclasses import dataclass
 from typing import List, Tuple, Optional
 
+import numpy as np
+
 from mcts.mcts_core.state_manager import StateManager, GameState
 
 
@@ -69,15 +71,134 @@ class LedgeStateManager(StateManager):
                 prev_coin_index = coin_index
         return successor_states
 
+    def get_legal_action_count(self, state: LedgeState) -> int:
+        # picking a coin, and every empty cell left of the last coin is a target for the first coin to its right
+        board = state.board
+        last_coin_index = -1
+        for coin_index in range(len(board) - 1, -1, -1):
+            if board[coin_index] != 0:
+                last_coin_index = coin_index
+                break
+        num_coins_left_of_last = sum(1 for coin_type in board[:last_coin_index] if coin_type != 0)
+        num_moves = last_coin_index - num_coins_left_of_last if last_coin_index != -1 else 0
+        return num_moves + (1 if board[0] != 0 else 0)
+
+    def apply_action(self, state: LedgeState, action_index: int) -> LedgeState:
+        # same action order as get_successor_states
+        next_player = self.__other_player(state.player)
+        board = state.board
+        if board[0] != 0:
+            if action_index == 0:
+                return LedgeState(
+                    initial_state=False,
+                    board=(0,) + board[1:],
+                    coin_pick=board[0],
+                    player=next_player
+                )
+            action_index -= 1
+
+        prev_coin_index = -1
+        for coin_index, coin_type in enumerate(board):
+            if coin_type != 0:
+                num_coin_moves = coin_index - prev_coin_index - 1
+                if action_index < num_coin_moves:
+                    next_board = list(board)
+                    next_board[coin_index] = 0  # no coin
+                    next_board[coin_index - 1 - action_index] = coin_type
+                    return LedgeState(
+                        initial_state=False,
+                        board=tuple(next_board),
+                        coin_pick=-1,
+                        player=next_player
+                    )
+                action_index -= num_coin_moves
+                prev_coin_index = coin_index
+
+        raise IndexError("action index out of range")
+
+    def sample_successor_state(self, state: LedgeState) -> LedgeState:
+        return self.apply_action(state, random.randrange(self.get_legal_action_count(state)))
+
+    def batch_rollout(self, state: LedgeState, num_rollouts: int) -> np.ndarray:
+        if self.is_terminal_state(state):
+            return np.full(num_rollouts, self.player_won(state), dtype=np.int8)
+
+        rng = np.random.default_rng(random.getrandbits(64))
+        board_len = len(state.board)
+        cell_indices = np.arange(board_len)
+        boards = np.tile(np.array(state.board, dtype=np.int8), (num_rollouts, 1))
+        next_players = np.full(num_rollouts, self.__other_player(state.player), dtype=np.int8)
+        winners = np.full(num_rollouts, -1, dtype=np.int8)
+        active = np.arange(num_rollouts)  # the games not finished yet
+
+        # every game makes one random move per step
+        while active.size > 0:
+            board = boards[active]
+            game_indices = np.arange(active.size)
+            is_coin = board != 0
+
+            # an empty cell is a move target of the first coin to its right
+            coin_indices = np.where(is_coin, cell_indices, board_len)
+            next_coin_index = np.minimum.accumulate(coin_indices[:, ::-1], axis=1)[:, ::-1]
+            first_coin_right = np.full_like(next_coin_index, board_len)
+            first_coin_right[:, :-1] = next_coin_index[:, 1:]
+            is_target = ~is_coin & (first_coin_right != board_len)
+
+            can_pick = is_coin[:, 0]
+            num_actions = is_target.sum(axis=1) + can_pick
+            actions = rng.integers(0, num_actions)  # picking is action 0 when possible
+            picks = can_pick & (actions == 0)
+            moves = ~picks
+
+            target_ranks = actions - can_pick
+            targets = np.argmax(np.cumsum(is_target, axis=1) > target_ranks[:, None], axis=1)
+            move_games = game_indices[moves]
+            move_targets = targets[moves]
+            move_sources = first_coin_right[move_games, move_targets]
+            board[move_games, move_targets] = board[move_games, move_sources]
+            board[move_games, move_sources] = 0
+
+            picked_coins = board[picks, 0]
+            board[picks, 0] = 0
+
+            finished = np.zeros(active.size, dtype=bool)
+            finished[picks] = picked_coins == 2
+            winners[active[finished]] = next_players[active[finished]]
+
+            boards[active] = board
+            next_players[active] ^= 1
+            active = active[~finished]
+
+        return winners
+
     def is_terminal_state(self, state: LedgeState) -> bool:
         return state.coin_pick == 2
 
+    def get_player_to_move(self, state: LedgeState) -> int:
+        # states record the player who made the last move
+        return self.__other_player(state.player)
+
     def player_won(self, state: LedgeState) -> int:
         if self.is_terminal_state(state):
             return state.player
         else:
             return -1
 
+    def serialize_state(self, state: LedgeState) -> bytes:
+        return bytes([int(state.initial_state), state.coin_pick + 1, state.player]) + bytes(state.board)
+
+    def deserialize_state(self, data: bytes) -> LedgeState:
+        return LedgeState(
+            initial_state=bool(data[0]),
+            board=tuple(data[3:]),
+            coin_pick=data[1] - 1,
+            player=data[2]
+        )
+
+    def encode_state(self, state: LedgeState) -> np.ndarray:
+        # the board followed by the player who made the last move
+        return np.array(state.board + (state.player,), dtype=np.int8)
+
     def action_str(self, state: LedgeState, previous_state: Optional[LedgeState]) -> str:
         state_player = state.player
         if state.initial_state:
@@ -1,7 +1,10 @@
 import random
+import struct
 from dataclasses import dataclass
 from typing import List, Optional
 
+import numpy as np
+
 from mcts.mcts_core.state_manager import StateManager
 
 
@@ -51,6 +54,49 @@ class NimStateManager(StateManager):
             if next_num_pieces >= 0
         ]
 
+    def get_legal_action_count(self, state: NimState) -> int:
+        return max(0, min(self._max_turn_pieces_remove, state.num_pieces))
+
+    def apply_action(self, state: NimState, action_index: int) -> NimState:
+        # same action order as get_successor_states, action i removes i+1 pieces
+        if not 0 <= action_index < self.get_legal_action_count(state):
+            raise IndexError("action index out of range")
+        return NimState(
+            num_pieces=state.num_pieces - (action_index + 1),
+            player=self.__other_player(state.player),
+            initial_state=False
+        )
+
+    def sample_successor_state(self, state: NimState) -> NimState:
+        return self.apply_action(state, random.randrange(self.get_legal_action_count(state)))
+
+    def get_player_to_move(self, state: NimState) -> int:
+        # states record the player who made the last move
+        return self.__other_player(state.player)
+
+    def batch_rollout(self, state: NimState, num_rollouts: int) -> np.ndarray:
+        if self.is_terminal_state(state):
+            return np.full(num_rollouts, self.player_won(state), dtype=np.int8)
+
+        rng = np.random.default_rng(random.getrandbits(64))
+        num_pieces = np.full(num_rollouts, state.num_pieces, dtype=np.int64)
+        next_players = np.full(num_rollouts, self.__other_player(state.player), dtype=np.int8)
+        winners = np.full(num_rollouts, -1, dtype=np.int8)
+        active = np.arange(num_rollouts)  # the games not finished yet
+
+        while active.size > 0:
+            pieces = num_pieces[active]
+            pieces -= rng.integers(1, np.minimum(self._max_turn_pieces_remove, pieces) + 1)
+            num_pieces[active] = pieces
+
+            # the player taking the last piece wins
+            finished = pieces <= 0
+            winners[active[finished]] = next_players[active[finished]]
+            next_players[active] ^= 1
+            active = active[~finished]
+
+        return winners
+
     def is_terminal_state(self, state: NimState) -> bool:
         return state.num_pieces <= 0
 
@@ -60,6 +106,28 @@ class NimStateManager(StateManager):
         else:
             return -1
 
+    def game_value(self, state: NimState) -> int:
+        """
+        The winner with perfect play, in closed form: the player to move loses exactly when the pile is a multiple of
+        max_turn_pieces_remove + 1, as the opponent can always restore that
+        """
+        if self.is_terminal_state(state):
+            return self.player_won(state)
+        player_to_move = self.__other_player(state.player)
+        if state.num_pieces % (self._max_turn_pieces_remove + 1) == 0:
+            return state.player
+        return player_to_move
+
+    def serialize_state(self, state: NimState) -> bytes:
+        return struct.pack('<qb?', state.num_pieces, state.player, state.initial_state)
+
+    def deserialize_state(self, data: bytes) -> NimState:
+        num_pieces, player, initial_state = struct.unpack('<qb?', data)
+        return NimState(num_pieces=num_pieces, player=player, initial_state=initial_state)
+
+    def encode_state(self, state: NimState) -> np.ndarray:
+        return np.array([state.num_pieces, state.player], dtype=np.int64)
+
     def action_str(self, state: NimState, previous_state: Optional[NimState] = None) -> str:
         if state.initial_state:
             return f"Start Pile: {state.num_pieces} stones"
@@ -6,5 +6,6 @@ setup(
     version='0.1.0',
     packages=find_packages(
         include=['mcts', 'mcts.*']),
-    package_data={'mcts': []}
+    package_data={'mcts': []},
+    install_requires=['numpy']
 )
\ No newline at end of file